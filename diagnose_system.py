@@ -6,171 +6,246 @@
 
 import os
 import sys
+import glob
+import functools
+import contextlib
+import importlib
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+def emit(lines):
+    """一次写出多行输出，减少write系统调用（manage_databases也使用）"""
+    sys.stdout.write("\n".join(lines))
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+
+@contextlib.contextmanager
+def _section():
+    """收集一个检查项的输出行，结束（包括提前返回或异常）时统一写出"""
+    out = []
+    try:
+        yield out
+    finally:
+        if out:
+            emit(out)
+
+def _dir_names(path):
+    """一次性读取目录下的条目名称，目录不存在时返回空集合"""
+    try:
+        with os.scandir(path) as it:
+            return {entry.name for entry in it}
+    except OSError:
+        return set()
+
+@functools.lru_cache(maxsize=1)
+def get_api_key():
+    """读取.env并返回OPENAI_API_KEY（每个进程只解析一次，run_rag_system也使用）"""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return os.getenv("OPENAI_API_KEY")
+
+# 包名与导入名不一致的依赖
+_MODULE_NAMES = {'python-dotenv': 'dotenv'}
+
+@functools.lru_cache(maxsize=None)
+def has_module(module):
+    """检查模块是否可导入（只查找模块，不执行导入）"""
+    try:
+        return importlib.util.find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+def _has(package):
+    """按包名检查依赖是否已安装"""
+    return has_module(_MODULE_NAMES.get(package, package.replace('-', '_')))
+
+# main()中提前在后台线程导入的大型依赖
+_preloads = {}
+
+def _import(module):
+    """导入模块，若已在后台预加载则直接等待其结果"""
+    future = _preloads.get(module)
+    if future is not None:
+        return future.result()
+    return importlib.import_module(module)
+
+@functools.lru_cache(maxsize=1)
+def get_openai_client():
+    """返回进程内共享的OpenAI客户端（复用其HTTP连接池）"""
+    return _import('openai').OpenAI(api_key=get_api_key())
 
 def check_dependencies():
     """检查依赖包"""
-    print("🔍 检查Python依赖包...")
-    
-    required_packages = [
-        'streamlit',
-        'openai', 
-        'faiss',
-        'numpy',
-        'python-dotenv'
-    ]
-    
-    missing_packages = []
-    
-    for package in required_packages:
-        try:
-            __import__(package.replace('-', '_'))
-            print(f"  ✅ {package}")
-        except ImportError:
-            print(f"  ❌ {package}")
-            missing_packages.append(package)
-    
-    if missing_packages:
-        print(f"\n❌ 缺少依赖包: {', '.join(missing_packages)}")
-        print("请运行: pip install -r requirements.txt")
-        return False
-    
-    return True
+    with _section() as out:
+        out.append("🔍 检查Python依赖包...")
+        
+        required_packages = [
+            'streamlit',
+            'openai', 
+            'faiss',
+            'numpy',
+            'python-dotenv'
+        ]
+        
+        missing_packages = [package for package in required_packages if not _has(package)]
+        
+        out.append("\n".join(
+            f"  {'❌' if package in missing_packages else '✅'} {package}"
+            for package in required_packages
+        ))
+        
+        if missing_packages:
+            out.append(f"\n❌ 缺少依赖包: {', '.join(missing_packages)}")
+            out.append("请运行: pip install -r requirements.txt")
+            return False
+        
+        return True
 
 def check_env_file():
     """检查环境变量文件"""
-    print("\n🔍 检查环境配置...")
-    
-    if not os.path.exists('.env'):
-        print("  ❌ .env文件不存在")
-        print("  请创建.env文件并添加: OPENAI_API_KEY=your_key_here")
-        return False
-    
-    print("  ✅ .env文件存在")
-    
-    try:
-        from dotenv import load_dotenv
-        load_dotenv()
-        api_key = os.getenv("OPENAI_API_KEY")
+    with _section() as out:
+        out.append("\n🔍 检查环境配置...")
         
-        if not api_key:
-            print("  ❌ OPENAI_API_KEY未设置")
-            return False
-        elif api_key == "your_openai_api_key_here":
-            print("  ❌ OPENAI_API_KEY是默认值，请设置真实的API密钥")
+        if not os.path.exists('.env'):
+            out.append("  ❌ .env文件不存在")
+            out.append("  请创建.env文件并添加: OPENAI_API_KEY=your_key_here")
             return False
-        else:
-            print("  ✅ OPENAI_API_KEY已设置")
-            return True
+        
+        out.append("  ✅ .env文件存在")
+        
+        try:
+            api_key = get_api_key()
             
-    except Exception as e:
-        print(f"  ❌ 读取.env文件失败: {str(e)}")
-        return False
+            if not api_key:
+                out.append("  ❌ OPENAI_API_KEY未设置")
+                return False
+            elif api_key == "your_openai_api_key_here":
+                out.append("  ❌ OPENAI_API_KEY是默认值，请设置真实的API密钥")
+                return False
+            else:
+                out.append("  ✅ OPENAI_API_KEY已设置")
+                return True
+                
+        except Exception as e:
+            out.append(f"  ❌ 读取.env文件失败: {str(e)}")
+            return False
 
 def check_files():
     """检查必要文件"""
-    print("\n🔍 检查项目文件...")
-    
-    required_files = [
-        'step1_document_parser.py',
-        'step2_vector_database.py', 
-        'step3_qa_system.py',
-        'input_files/upfluencer.pdf'
-    ]
-    
-    all_exist = True
-    
-    for file_path in required_files:
-        if os.path.exists(file_path):
-            print(f"  ✅ {file_path}")
-        else:
-            print(f"  ❌ {file_path}")
-            all_exist = False
-    
-    return all_exist
+    with _section() as out:
+        out.append("\n🔍 检查项目文件...")
+        
+        required_files = [
+            'step1_document_parser.py',
+            'step2_vector_database.py', 
+            'step3_qa_system.py',
+            'input_files/upfluencer.pdf'
+        ]
+        
+        all_exist = True
+        
+        # 按父目录分组，每个目录只读取一次
+        dir_names = {}
+        for file_path in required_files:
+            parent = os.path.dirname(file_path) or '.'
+            if parent not in dir_names:
+                dir_names[parent] = _dir_names(parent)
+        
+        for file_path in required_files:
+            parent = os.path.dirname(file_path) or '.'
+            if os.path.basename(file_path) in dir_names[parent]:
+                out.append(f"  ✅ {file_path}")
+            else:
+                out.append(f"  ❌ {file_path}")
+                all_exist = False
+        
+        return all_exist
 
 def check_processed_data():
     """检查处理后的数据"""
-    print("\n🔍 检查处理后的数据...")
-    
-    # 检查step1输出
-    output_found = False
-    if os.path.exists('./output'):
-        for root, dirs, files in os.walk('./output'):
-            for file in files:
-                if file.endswith('_content_list.json') or file.endswith('.md'):
-                    output_found = True
-                    print(f"  ✅ 找到输出文件: {os.path.join(root, file)}")
-    
-    if not output_found:
-        print("  ❌ 未找到Step1输出文件，请先运行: python step1_document_parser.py")
-        return False
-    
-    # 检查step2输出
-    vector_db_files = ['index.faiss', 'texts.pkl', 'metadata.pkl', 'config.json']
-    vector_db_found = True
-    
-    for file in vector_db_files:
-        file_path = f'./vector_db/{file}'
-        if os.path.exists(file_path):
-            print(f"  ✅ 向量数据库文件: {file}")
+    with _section() as out:
+        out.append("\n🔍 检查处理后的数据...")
+        
+        # 检查step1输出（找到第一个即停止扫描）
+        found = (next(glob.iglob('./output/**/*_content_list.json', recursive=True), None)
+                 or next(glob.iglob('./output/**/*.md', recursive=True), None))
+        output_found = found is not None
+        if output_found:
+            out.append(f"  ✅ 找到输出文件: {found}")
+        
+        if not output_found:
+            out.append("  ❌ 未找到Step1输出文件，请先运行: python step1_document_parser.py")
+            return False
+        
+        # 检查step2输出
+        vector_db_names = _dir_names('./vector_db')
+        if 'texts.pkl' in vector_db_names:
+            # 旧版pickle格式
+            vector_db_files = ['index.faiss', 'texts.pkl', 'metadata.pkl', 'config.json']
         else:
-            print(f"  ❌ 向量数据库文件: {file}")
-            vector_db_found = False
-    
-    if not vector_db_found:
-        print("  ❌ 向量数据库不完整，请先运行: python step2_vector_database.py")
-        return False
-    
-    return True
+            vector_db_files = ['index.faiss', 'texts.bin', 'texts_offsets.npy',
+                               'metadata.jsonl', 'metadata_offsets.npy', 'config.json']
+        vector_db_found = True
+        
+        for file in vector_db_files:
+            if file in vector_db_names:
+                out.append(f"  ✅ 向量数据库文件: {file}")
+            else:
+                out.append(f"  ❌ 向量数据库文件: {file}")
+                vector_db_found = False
+        
+        if not vector_db_found:
+            out.append("  ❌ 向量数据库不完整，请先运行: python step2_vector_database.py")
+            return False
+        
+        return True
 
 def test_streamlit_import():
     """测试Streamlit导入"""
-    print("\n🔍 测试Streamlit导入...")
-    
-    try:
-        import streamlit as st
-        print("  ✅ Streamlit导入成功")
-        
-        # 测试basic functions
-        st.write  # 测试是否可以访问
-        st.title
-        st.chat_message
-        print("  ✅ Streamlit基本功能可用")
-        return True
+    with _section() as out:
+        out.append("\n🔍 测试Streamlit导入...")
         
-    except Exception as e:
-        print(f"  ❌ Streamlit导入失败: {str(e)}")
-        return False
+        try:
+            st = _import('streamlit')
+            out.append("  ✅ Streamlit导入成功")
+            
+            # 测试basic functions
+            st.write  # 测试是否可以访问
+            st.title
+            st.chat_message
+            out.append("  ✅ Streamlit基本功能可用")
+            return True
+            
+        except Exception as e:
+            out.append(f"  ❌ Streamlit导入失败: {str(e)}")
+            return False
 
 def test_openai_connection():
     """测试OpenAI连接"""
-    print("\n🔍 测试OpenAI连接...")
-    
-    try:
-        from dotenv import load_dotenv
-        load_dotenv()
-        api_key = os.getenv("OPENAI_API_KEY")
+    with _section() as out:
+        out.append("\n🔍 测试OpenAI连接...")
         
-        if not api_key or api_key == "your_openai_api_key_here":
-            print("  ❌ API密钥未正确设置")
+        try:
+            api_key = get_api_key()
+            
+            if not api_key or api_key == "your_openai_api_key_here":
+                out.append("  ❌ API密钥未正确设置")
+                return False
+            
+            client = get_openai_client()
+            
+            # 简单测试API连接（不实际调用，只测试client创建）
+            out.append("  ✅ OpenAI客户端创建成功")
+            out.append("  💡 API连接测试跳过（避免费用），实际使用时会测试")
+            return True
+            
+        except Exception as e:
+            out.append(f"  ❌ OpenAI连接测试失败: {str(e)}")
             return False
-        
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-        
-        # 简单测试API连接（不实际调用，只测试client创建）
-        print("  ✅ OpenAI客户端创建成功")
-        print("  💡 API连接测试跳过（避免费用），实际使用时会测试")
-        return True
-        
-    except Exception as e:
-        print(f"  ❌ OpenAI连接测试失败: {str(e)}")
-        return False
 
 def main():
     """主诊断函数"""
-    print("🤖 RAG问答系统诊断工具")
-    print("=" * 50)
+    emit(["🤖 RAG问答系统诊断工具", "=" * 50])
     
     checks = [
         ("依赖包检查", check_dependencies),
@@ -183,30 +258,37 @@ def main():
     
     all_passed = True
     
-    for check_name, check_func in checks:
-        try:
-            result = check_func()
-            if not result:
+    # 大型依赖的导入与文件检查并行进行
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for module in ('streamlit', 'openai'):
+            _preloads[module] = executor.submit(importlib.import_module, module)
+        
+        for check_name, check_func in checks:
+            try:
+                result = check_func()
+                if not result:
+                    all_passed = False
+            except Exception as e:
+                emit([f"  ❌ {check_name}出错: {str(e)}"])
                 all_passed = False
-        except Exception as e:
-            print(f"  ❌ {check_name}出错: {str(e)}")
-            all_passed = False
     
-    print("\n" + "=" * 50)
+    out = ["\n" + "=" * 50]
     
     if all_passed:
-        print("✅ 所有检查通过！系统应该可以正常运行")
-        print("\n推荐运行顺序:")
-        print("1. streamlit run step3_qa_system.py")
-        print("2. 在浏览器中打开 http://localhost:8501")
+        out.append("✅ 所有检查通过！系统应该可以正常运行")
+        out.append("\n推荐运行顺序:")
+        out.append("1. streamlit run step3_qa_system.py")
+        out.append("2. 在浏览器中打开 http://localhost:8501")
     else:
-        print("❌ 发现问题，请根据上述检查结果修复")
-        print("\n建议修复步骤:")
-        print("1. 安装缺少的依赖: pip install -r requirements.txt")
-        print("2. 配置API密钥: 编辑.env文件")
-        print("3. 运行数据处理: python step1_document_parser.py")
-        print("4. 构建向量数据库: python step2_vector_database.py")
-        print("5. 启动问答系统: streamlit run step3_qa_system.py")
+        out.append("❌ 发现问题，请根据上述检查结果修复")
+        out.append("\n建议修复步骤:")
+        out.append("1. 安装缺少的依赖: pip install -r requirements.txt")
+        out.append("2. 配置API密钥: 编辑.env文件")
+        out.append("3. 运行数据处理: python step1_document_parser.py")
+        out.append("4. 构建向量数据库: python step2_vector_database.py")
+        out.append("5. 启动问答系统: streamlit run step3_qa_system.py")
+    
+    emit(out)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -6,86 +6,159 @@
 """
 
 import os
+import re
+import stat
 import json
 import argparse
+import sys
 import shutil
+import functools
+import subprocess
 from datetime import datetime
+from diagnose_system import emit
 
-def list_databases():
+# 数据库名称：字母、数字、下划线和连字符
+_NAME_RE = re.compile(r'[A-Za-z0-9_-]+')
+
+def _scan_dbs():
+    """扫描当前目录下的默认数据库和命名数据库（vector_db_*），单次os.scandir完成，指向目录的符号链接也计入"""
+    prefix = "vector_db_"
+    default = []
+    named = []
+    with os.scandir(".") as it:
+        for entry in it:
+            if entry.name == "vector_db":
+                if entry.is_dir():
+                    default.append({"name": "默认数据库", "path": "./vector_db", "type": "default"})
+            elif entry.name.startswith(prefix) and entry.is_dir():
+                named.append({"name": entry.name[len(prefix):], "path": entry.name, "type": "named"})
+    return default + named
+
+class DatabaseRegistry:
+    """数据库列表缓存，交互式菜单中共享一次扫描结果，创建或删除后再刷新"""
+    
+    def __init__(self):
+        self._dbs = None
+    
+    def refresh(self):
+        self._dbs = _scan_dbs()
+    
+    def all(self):
+        if self._dbs is None:
+            self.refresh()
+        return self._dbs
+    
+    def named(self):
+        return [db for db in self.all() if db["type"] == "named"]
+
+@functools.lru_cache(maxsize=64)
+def _load_config_cached(path, mtime_ns):
+    """读取config.json，以(路径, 修改时间)为键缓存，文件变化后自动失效"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _run_streaming(cmd):
+    """运行子进程并实时转发输出（stderr合并到stdout），返回退出码"""
+    # 子进程输出到管道时默认块缓冲，关闭缓冲才能逐行看到进度
+    env = dict(os.environ, PYTHONUNBUFFERED="1", PYTHONIOENCODING="utf-8")
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            bufsize=1, text=True, encoding='utf-8', env=env)
+    with proc:
+        for line in proc.stdout:
+            sys.stdout.write(line)
+    return proc.returncode
+
+def _hardlink_tree(src, dst):
+    """
+    以硬链接方式快照目录，只创建目录项不复制数据
+    
+    向量数据库文件保存后不会原地修改，硬链接即可作为备份；
+    跨文件系统等无法建立硬链接时退回到复制
+    """
+    os.makedirs(dst, exist_ok=True)
+    with os.scandir(src) as it:
+        for entry in it:
+            target = os.path.join(dst, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                _hardlink_tree(entry.path, target)
+            else:
+                try:
+                    os.link(entry.path, target)
+                except OSError:
+                    shutil.copy2(entry.path, target)
+
+def list_databases(registry=None):
     """列出所有可用的数据库"""
-    print("🗄️ 可用的向量数据库:")
-    print("-" * 50)
+    out = ["🗄️ 可用的向量数据库:", "-" * 50]
     
-    databases = []
-    
-    # 默认数据库
-    if os.path.exists("./vector_db"):
-        databases.append({
-            "name": "默认数据库",
-            "path": "./vector_db",
-            "type": "default"
-        })
-    
-    # 命名数据库
-    for item in os.listdir("."):
-        if item.startswith("vector_db_") and os.path.isdir(item):
-            db_name = item.replace("vector_db_", "")
-            databases.append({
-                "name": db_name,
-                "path": item,
-                "type": "named"
-            })
+    # 默认数据库和命名数据库
+    databases = (registry or DatabaseRegistry()).all()
     
     if not databases:
-        print("❌ 未找到任何数据库")
-        print("💡 请先运行 Step 1 和 Step 2 创建数据库")
+        out.append("❌ 未找到任何数据库")
+        out.append("💡 请先运行 Step 1 和 Step 2 创建数据库")
+        emit(out)
         return
     
     for i, db in enumerate(databases, 1):
-        print(f"{i}. {db['name']}")
-        print(f"   路径: {db['path']}")
+        out.append(f"{i}. {db['name']}")
+        out.append(f"   路径: {db['path']}")
         
         # 显示数据库统计信息
         config_path = os.path.join(db['path'], 'config.json')
-        if os.path.exists(config_path):
+        try:
+            config_stat = os.stat(config_path)
+        except OSError:
+            config_stat = None
+        
+        if config_stat:
             try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                print(f"   向量数: {config.get('total_vectors', 'N/A')}")
-                print(f"   维度: {config.get('dimension', 'N/A')}")
-                print(f"   模型: {config.get('model_name', 'N/A')}")
+                config = _load_config_cached(config_path, config_stat.st_mtime_ns)
+                out.append(f"   向量数: {config.get('total_vectors', 'N/A')}")
+                out.append(f"   维度: {config.get('dimension', 'N/A')}")
+                out.append(f"   模型: {config.get('model_name', 'N/A')}")
             except:
-                print("   状态: 配置文件读取失败")
+                out.append("   状态: 配置文件读取失败")
         else:
-            print("   状态: 未完成构建")
+            out.append("   状态: 未完成构建")
         
         # 检查源文件
         if db['type'] == 'named':
             output_dir = f"./output_{db['name']}"
             if os.path.exists(output_dir):
-                print(f"   源文件: ✅ {output_dir}")
+                out.append(f"   源文件: ✅ {output_dir}")
             else:
-                print(f"   源文件: ❌ {output_dir}")
+                out.append(f"   源文件: ❌ {output_dir}")
         else:
             if os.path.exists("./output"):
-                print(f"   源文件: ✅ ./output")
+                out.append(f"   源文件: ✅ ./output")
             else:
-                print(f"   源文件: ❌ ./output")
+                out.append(f"   源文件: ❌ ./output")
         
-        print()
+        out.append("")
+    
+    emit(out)
 
-def create_database():
-    """创建新数据库的向导"""
+def create_database(registry=None, db_name=None, pdf_path=None, assume_yes=False):
+    """
+    创建新数据库的向导
+    
+    Args:
+        registry (DatabaseRegistry): 共享的数据库列表，创建后刷新
+        db_name (str): 数据库名称，未提供时交互输入
+        pdf_path (str): PDF文件路径，未提供时交互输入
+        assume_yes (bool): 跳过确认提示
+    """
     print("🆕 创建新数据库向导")
     print("-" * 50)
     
     # 获取数据库名称
-    db_name = input("请输入数据库名称 (英文，用于区分不同领域): ").strip()
+    db_name = (db_name or input("请输入数据库名称 (英文，用于区分不同领域): ")).strip()
     if not db_name:
         print("❌ 数据库名称不能为空")
         return
     
-    if not db_name.replace('_', '').replace('-', '').isalnum():
+    if not _NAME_RE.fullmatch(db_name):
         print("❌ 数据库名称只能包含字母、数字、下划线和连字符")
         return
     
@@ -96,15 +169,22 @@ def create_database():
         return
     
     # 获取PDF文件路径
-    pdf_path = input("请输入PDF文件路径: ").strip()
+    pdf_path = (pdf_path or input("请输入PDF文件路径: ")).strip()
     if not pdf_path:
         print("❌ PDF文件路径不能为空")
         return
     
-    if not os.path.exists(pdf_path):
+    # 一次stat同时确认文件存在且为普通文件
+    try:
+        pdf_stat = os.stat(pdf_path)
+    except OSError:
         print(f"❌ 文件不存在: {pdf_path}")
         return
     
+    if not stat.S_ISREG(pdf_stat.st_mode):
+        print(f"❌ 不是有效的文件: {pdf_path}")
+        return
+    
     if not pdf_path.lower().endswith('.pdf'):
         print("❌ 请提供PDF文件")
         return
@@ -115,16 +195,13 @@ def create_database():
     print(f"   输出目录: ./output_{db_name}")
     print(f"   数据库目录: ./vector_db_{db_name}")
     
-    confirm = input("\n确认创建? (y/N): ").strip().lower()
+    confirm = 'y' if assume_yes else input("\n确认创建? (y/N): ").strip().lower()
     if confirm != 'y':
         print("❌ 取消创建")
         return
     
     # 运行Step 1
     print("\n🔄 Step 1: 解析PDF文档...")
-    import subprocess
-    import sys
-    
     cmd1 = [
         sys.executable, "step1_document_parser.py",
         "--input", pdf_path,
@@ -132,9 +209,8 @@ def create_database():
     ]
     
     try:
-        result = subprocess.run(cmd1, capture_output=True, text=True, encoding='utf-8')
-        if result.returncode != 0:
-            print(f"❌ Step 1 失败: {result.stderr}")
+        if _run_streaming(cmd1) != 0:
+            print("❌ Step 1 失败")
             return
         print("✅ Step 1 完成")
     except Exception as e:
@@ -149,68 +225,92 @@ def create_database():
     ]
     
     try:
-        result = subprocess.run(cmd2, capture_output=True, text=True, encoding='utf-8')
-        if result.returncode != 0:
-            print(f"❌ Step 2 失败: {result.stderr}")
+        if _run_streaming(cmd2) != 0:
+            print("❌ Step 2 失败")
             return
         print("✅ Step 2 完成")
     except Exception as e:
         print(f"❌ Step 2 执行失败: {str(e)}")
         return
     
+    if registry:
+        registry.refresh()
+    
     print(f"\n🎉 数据库 '{db_name}' 创建成功!")
     print("现在可以在Step 3中选择使用这个数据库")
 
-def delete_database():
-    """删除数据库"""
+def _find_database(databases, name):
+    """按名称或目录名查找数据库，未找到时返回None"""
+    for db in databases:
+        if name in (db['name'], os.path.basename(db['path'])):
+            return db
+    return None
+
+def delete_database(registry=None, db_name=None, assume_yes=False):
+    """
+    删除数据库
+    
+    Args:
+        registry (DatabaseRegistry): 共享的数据库列表，删除后刷新
+        db_name (str): 要删除的数据库名称，未提供时交互选择
+        assume_yes (bool): 跳过确认提示（不会删除源文件目录）
+    """
     print("🗑️ 删除数据库")
     print("-" * 50)
     
     # 列出可删除的数据库（不包括默认数据库）
-    databases = []
-    for item in os.listdir("."):
-        if item.startswith("vector_db_") and os.path.isdir(item):
-            db_name = item.replace("vector_db_", "")
-            databases.append({"name": db_name, "path": item})
+    registry = registry or DatabaseRegistry()
+    databases = registry.named()
     
     if not databases:
         print("❌ 没有可删除的命名数据库")
         return
     
-    print("可删除的数据库:")
-    for i, db in enumerate(databases, 1):
-        print(f"{i}. {db['name']} ({db['path']})")
+    if db_name:
+        selected_db = _find_database(databases, db_name)
+        if selected_db is None:
+            print(f"❌ 数据库不存在: {db_name}")
+            return
+    else:
+        print("可删除的数据库:")
+        for i, db in enumerate(databases, 1):
+            print(f"{i}. {db['name']} ({db['path']})")
     
     try:
-        choice = int(input("\n请选择要删除的数据库编号: ")) - 1
-        if choice < 0 or choice >= len(databases):
-            print("❌ 无效选择")
-            return
-        
-        selected_db = databases[choice]
+        if not db_name:
+            choice = int(input("\n请选择要删除的数据库编号: ")) - 1
+            if choice < 0 or choice >= len(databases):
+                print("❌ 无效选择")
+                return
+            
+            selected_db = databases[choice]
         
         print(f"\n⚠️ 即将删除数据库: {selected_db['name']}")
         print(f"   数据库路径: {selected_db['path']}")
         print(f"   源文件路径: ./output_{selected_db['name']}")
         
-        confirm = input("确认删除? 此操作不可恢复! (y/N): ").strip().lower()
+        confirm = 'y' if assume_yes else input("确认删除? 此操作不可恢复! (y/N): ").strip().lower()
         if confirm != 'y':
             print("❌ 取消删除")
             return
         
-        # 删除数据库目录
-        if os.path.exists(selected_db['path']):
+        # 删除数据库目录（符号链接只删除链接本身，不删除其指向的目录）
+        if os.path.islink(selected_db['path']):
+            os.unlink(selected_db['path'])
+            print(f"✅ 已删除数据库链接: {selected_db['path']}")
+        elif os.path.exists(selected_db['path']):
             shutil.rmtree(selected_db['path'])
             print(f"✅ 已删除数据库目录: {selected_db['path']}")
         
         # 删除源文件目录
         output_dir = f"./output_{selected_db['name']}"
-        if os.path.exists(output_dir):
+        if os.path.exists(output_dir) and not assume_yes:
             delete_output = input(f"是否同时删除源文件 {output_dir}? (y/N): ").strip().lower()
             if delete_output == 'y':
                 shutil.rmtree(output_dir)
                 print(f"✅ 已删除源文件目录: {output_dir}")
         
+        registry.refresh()
         print(f"🎉 数据库 '{selected_db['name']}' 删除成功!")
         
     except ValueError:
@@ -218,36 +318,42 @@ def delete_database():
     except Exception as e:
         print(f"❌ 删除失败: {str(e)}")
 
-def backup_database():
-    """备份数据库"""
+def backup_database(registry=None, db_name=None):
+    """
+    备份数据库
+    
+    Args:
+        registry (DatabaseRegistry): 共享的数据库列表
+        db_name (str): 要备份的数据库名称，未提供时交互选择
+    """
     print("💾 备份数据库")
     print("-" * 50)
     
     # 列出所有数据库
-    databases = []
-    if os.path.exists("./vector_db"):
-        databases.append({"name": "默认数据库", "path": "./vector_db", "type": "default"})
-    
-    for item in os.listdir("."):
-        if item.startswith("vector_db_") and os.path.isdir(item):
-            db_name = item.replace("vector_db_", "")
-            databases.append({"name": db_name, "path": item, "type": "named"})
+    databases = (registry or DatabaseRegistry()).all()
     
     if not databases:
         print("❌ 没有可备份的数据库")
         return
     
-    print("可备份的数据库:")
-    for i, db in enumerate(databases, 1):
-        print(f"{i}. {db['name']} ({db['path']})")
+    if db_name:
+        selected_db = _find_database(databases, db_name)
+        if selected_db is None:
+            print(f"❌ 数据库不存在: {db_name}")
+            return
+    else:
+        print("可备份的数据库:")
+        for i, db in enumerate(databases, 1):
+            print(f"{i}. {db['name']} ({db['path']})")
     
     try:
-        choice = int(input("\n请选择要备份的数据库编号: ")) - 1
-        if choice < 0 or choice >= len(databases):
-            print("❌ 无效选择")
-            return
-        
-        selected_db = databases[choice]
+        if not db_name:
+            choice = int(input("\n请选择要备份的数据库编号: ")) - 1
+            if choice < 0 or choice >= len(databases):
+                print("❌ 无效选择")
+                return
+            
+            selected_db = databases[choice]
         
         # 创建备份目录
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -257,8 +363,8 @@ def backup_database():
         backup_name = f"{selected_db['name']}_{timestamp}"
         backup_path = os.path.join(backup_dir, backup_name)
         
-        # 复制数据库
-        shutil.copytree(selected_db['path'], backup_path)
+        # 以硬链接快照数据库
+        _hardlink_tree(selected_db['path'], backup_path)
         
         print(f"✅ 数据库备份成功!")
         print(f"   备份路径: {backup_path}")
@@ -273,6 +379,12 @@ def main():
     parser = argparse.ArgumentParser(description='RAG数据库管理工具')
     parser.add_argument('action', nargs='?', choices=['list', 'create', 'delete', 'backup'],
                        help='操作类型')
+    parser.add_argument('--name', '-n',
+                       help='数据库名称 (create/delete/backup)')
+    parser.add_argument('--pdf', '-p',
+                       help='PDF文件路径 (create)')
+    parser.add_argument('--yes', '-y', action='store_true',
+                       help='跳过确认提示')
     
     args = parser.parse_args()
     
@@ -282,32 +394,35 @@ def main():
     if args.action == 'list':
         list_databases()
     elif args.action == 'create':
-        create_database()
+        create_database(db_name=args.name, pdf_path=args.pdf, assume_yes=args.yes)
     elif args.action == 'delete':
-        delete_database()
+        delete_database(db_name=args.name, assume_yes=args.yes)
     elif args.action == 'backup':
-        backup_database()
+        backup_database(db_name=args.name)
     else:
-        # 交互式菜单
+        # 交互式菜单，整个会话共享一份数据库列表
+        registry = DatabaseRegistry()
         while True:
-            print("\n请选择操作:")
-            print("1. 📋 列出所有数据库")
-            print("2. 🆕 创建新数据库")
-            print("3. 🗑️ 删除数据库")
-            print("4. 💾 备份数据库")
-            print("5. 🚪 退出")
+            emit([
+                "\n请选择操作:",
+                "1. 📋 列出所有数据库",
+                "2. 🆕 创建新数据库",
+                "3. 🗑️ 删除数据库",
+                "4. 💾 备份数据库",
+                "5. 🚪 退出",
+            ])
             
             try:
                 choice = input("\n请输入选择 (1-5): ").strip()
                 
                 if choice == '1':
-                    list_databases()
+                    list_databases(registry)
                 elif choice == '2':
-                    create_database()
+                    create_database(registry)
                 elif choice == '3':
-                    delete_database()
+                    delete_database(registry)
                 elif choice == '4':
-                    backup_database()
+                    backup_database(registry)
                 elif choice == '5':
                     print("👋 再见!")
                     break
@@ -9,20 +9,16 @@ import sys
 import subprocess
 import argparse
 from pathlib import Path
+from diagnose_system import get_api_key, has_module
 
 def check_dependencies():
     """检查依赖是否安装"""
-    try:
-        import raganything
-        import faiss
-        import openai
-        import streamlit
-        import langchain
-        return True
-    except ImportError as e:
-        print(f"❌ 缺少依赖: {e}")
+    missing = [m for m in ('raganything', 'faiss', 'openai', 'streamlit', 'langchain') if not has_module(m)]
+    if missing:
+        print(f"❌ 缺少依赖: {', '.join(missing)}")
         print("请运行: pip install -r requirements.txt")
         return False
+    return True
 
 def check_env_file():
     """检查.env文件"""
@@ -32,10 +28,7 @@ def check_env_file():
         print("OPENAI_API_KEY=your_openai_api_key_here")
         return False
     
-    from dotenv import load_dotenv
-    load_dotenv()
-    
-    api_key = os.getenv("OPENAI_API_KEY")
+    api_key = get_api_key()
     if not api_key or api_key == "your_openai_api_key_here":
         print("❌ 请在.env文件中设置有效的OPENAI_API_KEY")
         return False
@@ -49,21 +42,20 @@ def run_step1(db_name=None, input_pdf=None):
     print("="*50)
     
     try:
-        cmd = [sys.executable, "step1_document_parser.py"]
-        
-        if db_name:
-            cmd.extend(["--db-name", db_name])
+        # 在当前进程中直接调用，避免重新启动解释器和重复导入依赖
+        import step1_document_parser as s1
         
-        if input_pdf:
-            cmd.extend(["--input", input_pdf])
+        input_pdf = input_pdf or "./input_files/upfluencer.pdf"
+        output_dir = f"./output_{db_name}" if db_name else "./output"
         
-        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+        if not os.path.isfile(input_pdf):
+            print(f"错误: 输入文件不存在 {input_pdf}")
+            print("❌ Step 1 执行失败!")
+            return False
         
-        print(result.stdout)
-        if result.stderr:
-            print("警告:", result.stderr)
+        json_content, md_content = s1.parse_document(input_pdf, output_dir)
         
-        if result.returncode != 0:
+        if json_content is None:
             print("❌ Step 1 执行失败!")
             return False
         
@@ -81,18 +73,13 @@ def run_step2(db_name=None):
     print("="*50)
     
     try:
-        cmd = [sys.executable, "step2_vector_database.py"]
-        
-        if db_name:
-            cmd.extend(["--db-name", db_name])
+        # 在当前进程中直接调用，复用已加载的模块
+        import step2_vector_database as s2
         
-        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+        input_dir = f"./output_{db_name}" if db_name else "./output"
+        db_dir = f"./vector_db_{db_name}" if db_name else "./vector_db"
         
-        print(result.stdout)
-        if result.stderr:
-            print("警告:", result.stderr)
-        
-        if result.returncode != 0:
+        if not s2.build_vector_database(input_dir, db_dir, db_name=db_name):
             print("❌ Step 2 执行失败!")
             return False
         
@@ -155,7 +142,7 @@ def main():
         print("✅ 系统检查通过!")
     
     # 检查输入文件
-    if not os.path.exists("./input_files/upfluencer.pdf"):
+    if not os.path.isfile("./input_files/upfluencer.pdf"):
         print("❌ 未找到输入文件: ./input_files/upfluencer.pdf")
         return
     
@@ -176,13 +163,12 @@ def main():
             return
         run_step2(args.db_name)
     elif args.step == 3:
-        # 检查是否有任何数据库
-        has_db = os.path.exists("./vector_db")
-        if not has_db:
-            for item in os.listdir("."):
-                if item.startswith("vector_db_") and os.path.isdir(item):
-                    has_db = True
-                    break
+        # 检查是否有任何数据库（找到第一个即停止扫描）
+        with os.scandir(".") as it:
+            has_db = os.path.isdir("./vector_db") or any(
+                entry.name.startswith("vector_db_") and entry.is_dir(follow_symlinks=False)
+                for entry in it
+            )
         
         if not has_db:
             print("❌ 未找到任何向量数据库，请先运行Step 1和Step 2")
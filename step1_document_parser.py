@@ -6,9 +6,121 @@ Step 1: 文档处理模块
 """
 
 import os
+import re
 import json
+import functools
 from raganything.mineru_parser import MineruParser
 
+def _scan(root):
+    """
+    递归遍历目录，逐个产出文件条目
+
+    使用os.scandir，文件类型和大小直接取自DirEntry缓存，避免额外的stat调用；
+    打不开的目录（不存在或无权限）直接跳过
+
+    Args:
+        root (str): 根目录
+
+    Yields:
+        os.DirEntry: 文件条目
+    """
+    try:
+        it = os.scandir(root)
+    except OSError:
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+# JSON允许的空白字符
+_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+_JSON_DECODER = json.JSONDecoder()
+
+def _summarize_json(file_path):
+    """
+    逐个解码JSON文件的顶层元素，统计数量后立即丢弃，不构建完整的Python对象
+    
+    Args:
+        file_path (str): JSON文件路径
+        
+    Returns:
+        tuple: ('list', 条目数)、('dict', 键列表) 或 None（顶层不是容器）
+        
+    Raises:
+        ValueError: 文件为空或不是合法的JSON（与json.load一样校验语法）
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if not text:
+        raise ValueError("文件为空")
+    
+    skip = _WHITESPACE_RE.match
+    decode = _JSON_DECODER.raw_decode
+    idx = skip(text).end()
+    opener = text[idx:idx + 1]
+    if opener not in ('[', '{'):
+        json.loads(text)  # 标量很小，直接完整解析以校验语法
+        return None
+    is_dict = opener == '{'
+    closer = '}' if is_dict else ']'
+    
+    count = 0
+    keys = []
+    idx = skip(text, idx + 1).end()
+    if text[idx:idx + 1] != closer:
+        while True:
+            if is_dict:
+                if text[idx:idx + 1] != '"':
+                    raise ValueError(f"位置 {idx} 处应为字符串键")
+                key, idx = decode(text, idx)
+                keys.append(key)
+                idx = skip(text, idx).end()
+                if text[idx:idx + 1] != ':':
+                    raise ValueError(f"位置 {idx} 处缺少 ':'")
+                idx = skip(text, idx + 1).end()
+            _, idx = decode(text, idx)  # C实现的解码器，每次只保留一个元素
+            count += 1
+            idx = skip(text, idx).end()
+            separator = text[idx:idx + 1]
+            if separator == closer:
+                break
+            if separator != ',':
+                raise ValueError(f"位置 {idx} 处应为 ',' 或 '{closer}'")
+            idx = skip(text, idx + 1).end()
+    
+    if skip(text, idx + 1).end() != len(text):
+        raise ValueError(f"位置 {idx + 1} 之后有多余内容")
+    
+    return ('dict', keys) if is_dict else ('list', count)
+
+class _LazyText:
+    """
+    按需读取的文本文件，首次访问text（或str()）时才把内容读入内存
+    
+    不是str：字符串操作需先通过text或str()取得文本；len()和bool()只看文件大小，不读取文件
+    """
+    
+    def __init__(self, path):
+        self.path = path
+    
+    @functools.cached_property
+    def text(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    def __bool__(self):
+        return os.path.getsize(self.path) > 0
+    
+    def __len__(self):
+        """文件字节数（ASCII为主的Markdown约等于字符数）"""
+        return os.path.getsize(self.path)
+    
+    def __str__(self):
+        return self.text
+
 def parse_document(file_path, output_dir="./output", parse_method="auto"):
     """
     解析PDF文档
@@ -55,23 +167,21 @@ def check_output_files(output_dir):
     print("\n检查输出文件:")
     
     # 遍历输出目录
-    for root, dirs, files in os.walk(output_dir):
-        for file in files:
-            file_path = os.path.join(root, file)
-            file_size = os.path.getsize(file_path)
-            print(f"  - {file_path} ({file_size} bytes)")
-            
-            # 如果是JSON文件，显示内容结构
-            if file.endswith('.json'):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    if isinstance(data, list):
-                        print(f"    JSON包含 {len(data)} 个条目")
-                    elif isinstance(data, dict):
-                        print(f"    JSON包含键: {list(data.keys())}")
-                except Exception as e:
-                    print(f"    无法读取JSON文件: {str(e)}")
+    for entry in _scan(output_dir):
+        file_path = entry.path
+        file_size = entry.stat().st_size
+        print(f"  - {file_path} ({file_size} bytes)")
+        
+        # 如果是JSON文件，显示内容结构
+        if entry.name.endswith('.json'):
+            try:
+                summary = _summarize_json(file_path)
+                if summary and summary[0] == 'list':
+                    print(f"    JSON包含 {summary[1]} 个条目")
+                elif summary and summary[0] == 'dict':
+                    print(f"    JSON包含键: {summary[1]}")
+            except Exception as e:
+                print(f"    无法读取JSON文件: {str(e)}")
 
 def load_parsed_content(output_dir):
     """
@@ -82,31 +192,34 @@ def load_parsed_content(output_dir):
         
     Returns:
         dict: 包含JSON和MD内容的字典
+            - json_data / json_path: content_list.json的内容和路径
+            - md_data: _LazyText，不是str；按需读取，字符串操作前用str(content['md_data'])获取文本，
+              len()返回文件字节数
+            - md_path: MD文件路径
     """
     content = {}
     
     # 查找JSON和MD文件
-    for root, dirs, files in os.walk(output_dir):
-        for file in files:
-            file_path = os.path.join(root, file)
-            
-            if file.endswith('_content_list.json'):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content['json_data'] = json.load(f)
-                        content['json_path'] = file_path
-                    print(f"加载JSON内容: {len(content['json_data'])} 个条目")
-                except Exception as e:
-                    print(f"加载JSON文件失败: {str(e)}")
-                    
-            elif file.endswith('.md'):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content['md_data'] = f.read()
-                        content['md_path'] = file_path
-                    print(f"加载MD内容: {len(content['md_data'])} 个字符")
-                except Exception as e:
-                    print(f"加载MD文件失败: {str(e)}")
+    for entry in _scan(output_dir):
+        file_path = entry.path
+        
+        if entry.name.endswith('_content_list.json'):
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content['json_data'] = json.load(f)
+                    content['json_path'] = file_path
+                print(f"加载JSON内容: {len(content['json_data'])} 个条目")
+            except Exception as e:
+                print(f"加载JSON文件失败: {str(e)}")
+                
+        elif entry.name.endswith('.md'):
+            try:
+                # 只记录路径，文本在真正使用时才读取
+                content['md_data'] = _LazyText(file_path)
+                content['md_path'] = file_path
+                print(f"发现MD内容: {entry.stat().st_size} 字节")
+            except Exception as e:
+                print(f"加载MD文件失败: {str(e)}")
     
     return content
 
@@ -139,7 +252,7 @@ if __name__ == "__main__":
         print(f"数据库名称: {args.db_name}")
     
     # 检查输入文件是否存在
-    if not os.path.exists(args.input):
+    if not os.path.isfile(args.input):
         print(f"错误: 输入文件不存在 {args.input}")
         exit(1)
     
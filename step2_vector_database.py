@@ -6,37 +6,291 @@ Step 2: 向量数据库构建模块
 """
 
 import os
+import re
 import json
+import mmap
+import asyncio
+import functools
+import importlib.util
 import pickle
+import sqlite3
+import threading
 import numpy as np
 from dotenv import load_dotenv
 import faiss
-from openai import OpenAI
-from typing import List, Dict, Any
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from typing import List, Dict, Any, Iterable, Sequence, Tuple
 import time
 import hashlib
 
 # 加载环境变量
 load_dotenv()
 
+# OpenAI请求的连接池配置（高并发的批量embedding请求共享连接）
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+HTTP_TIMEOUT = httpx.Timeout(60.0)
+
+# 安装了h2时启用HTTP/2，多个并发请求复用同一个TCP/TLS连接
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+@functools.lru_cache(maxsize=1)
+def get_http_client() -> httpx.Client:
+    """返回进程内共享的HTTP客户端，供各个OpenAI客户端复用连接池"""
+    return httpx.Client(http2=HTTP2, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+
+# 向量数达到该规模时使用IVF索引，否则使用HNSW
+IVF_MIN_VECTORS = 100_000
+
+# 启用--gpu时，向量数达到该规模才在GPU上训练/添加（数据量小时主机与显存间的传输开销更大）。
+# 该规模下使用的IVF索引均有GPU实现
+GPU_MIN_VECTORS = 100_000
+
+# 向量存储精度对应的FAISS编码：fp16/sq8分别为半精度和8位标量量化
+PRECISIONS = {"fp32": "Flat", "fp16": "SQfp16", "sq8": "SQ8"}
+
+def _index_factory_string(n_vectors: int, precision: str = "fp16") -> str:
+    """
+    根据向量数量和存储精度选择FAISS索引结构
+    
+    Args:
+        n_vectors (int): 向量数量
+        precision (str): 存储精度 (fp32/fp16/sq8)
+        
+    Returns:
+        str: faiss.index_factory描述字符串
+    """
+    encoding = PRECISIONS[precision]
+    if n_vectors >= IVF_MIN_VECTORS:
+        nlist = int(4 * np.sqrt(n_vectors))
+        return f"IVF{nlist},{encoding}"
+    return "HNSW32" if encoding == "Flat" else f"HNSW32,{encoding}"
+
+# 数据库目录中的文件
+DB_FILES = (
+    "index.faiss", "config.json",
+    "texts.bin", "texts_offsets.npy", "metadata.jsonl", "metadata_offsets.npy",
+    "texts.pkl", "metadata.pkl", "embeddings.npy",  # 旧格式
+)
+
+def write_records(data_path: str, offsets_path: str, records: Iterable[bytes]):
+    """
+    把一组记录依次写入数据文件，并保存各记录起始位置的偏移数组（长度为记录数+1）
+    
+    Args:
+        data_path (str): 数据文件路径
+        offsets_path (str): 偏移数组（.npy）路径
+        records (Iterable[bytes]): 记录内容
+    """
+    offsets = [0]
+    with open(data_path, 'wb') as f:
+        for record in records:
+            f.write(record)
+            offsets.append(offsets[-1] + len(record))
+    np.save(offsets_path, np.asarray(offsets, dtype=np.int64))
+
+class MappedRecords(Sequence):
+    """
+    write_records写出的记录的只读视图，数据文件内存映射，按下标访问时才解码
+    
+    加载时不需要把所有记录反序列化到内存
+    """
+    
+    def __init__(self, data_path: str, offsets_path: str, decode):
+        self._offsets = np.load(offsets_path, mmap_mode='r')
+        self._decode = decode
+        with open(data_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._data = b''
+    
+    def __len__(self):
+        return len(self._offsets) - 1
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._decode(self._data[self._offsets[i]:self._offsets[i + 1]])
+
+def read_index(index_path: str):
+    """
+    以内存映射方式只读加载FAISS索引，页面按需载入而不是一次性读入内存
+    
+    Args:
+        index_path (str): 索引文件路径
+        
+    Returns:
+        faiss.Index: 加载的索引（不支持内存映射时退回普通加载）
+    """
+    try:
+        return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(index_path)
+
+def load_texts_and_metadata(db_dir: str):
+    """
+    加载数据库中的文本和元数据，兼容旧的pickle格式
+    
+    Args:
+        db_dir (str): 数据库目录
+        
+    Returns:
+        tuple: (文本序列, 元数据序列)，文件不存在时为空列表
+    """
+    texts_path = os.path.join(db_dir, "texts.bin")
+    if os.path.exists(texts_path):
+        texts = MappedRecords(texts_path, os.path.join(db_dir, "texts_offsets.npy"),
+                              lambda b: b.decode('utf-8'))
+        metadata = MappedRecords(os.path.join(db_dir, "metadata.jsonl"),
+                                 os.path.join(db_dir, "metadata_offsets.npy"), json.loads)
+        return texts, metadata
+    
+    texts = []
+    metadata = []
+    
+    pickle_path = os.path.join(db_dir, "texts.pkl")
+    if os.path.exists(pickle_path):
+        with open(pickle_path, 'rb') as f:
+            texts = pickle.load(f)
+    
+    pickle_path = os.path.join(db_dir, "metadata.pkl")
+    if os.path.exists(pickle_path):
+        with open(pickle_path, 'rb') as f:
+            metadata = pickle.load(f)
+    
+    return texts, metadata
+
+# Markdown标题行：行首（允许空白）以#开头，group(1)为#序列
+_HEADING_RE = re.compile(r'^[^\S\n]*(#+)[^\n]*', re.MULTILINE)
+
+def _chunk_ranges(n: int, chunk_size: int, overlap: int) -> np.ndarray:
+    """
+    计算分块的(start, end)区间，一次向量化计算代替逐块循环
+    
+    Args:
+        n (int): 文本长度
+        chunk_size (int): 块大小
+        overlap (int): 重叠大小
+        
+    Returns:
+        np.ndarray: 形状为(块数, 2)的区间数组
+    """
+    step = chunk_size - overlap
+    if step <= 0:
+        raise ValueError("overlap必须小于chunk_size")
+    count = -(-(n - chunk_size) // step) + 1 if n > chunk_size else 1
+    starts = np.arange(count, dtype=np.int64) * step
+    ends = np.minimum(starts + chunk_size, n)
+    return np.stack([starts, ends], axis=1)
+
+def _is_retryable(error: Exception) -> bool:
+    """限流、超时、网络和服务端错误可以重试；其他4xx错误（如输入超长）重试也不会成功"""
+    status = getattr(error, 'status_code', None)
+    return status is None or status in (408, 409, 429) or status >= 500
+
+class EmbeddingCache:
+    """
+    基于SQLite的embedding磁盘缓存，以SHA-1(模型名 + 文本)为键
+    
+    重复构建索引或重复提问时，未变化的文本不会再次请求API
+    """
+    
+    def __init__(self, path: str = "./.embed_cache.db"):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, model TEXT, vec BLOB)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(model: str, text: str) -> str:
+        return hashlib.sha1((model + text).encode('utf-8')).hexdigest()
+    
+    def get_many(self, model: str, texts: List[str]) -> List[Any]:
+        """
+        查询缓存
+        
+        Returns:
+            List: 与texts顺序一致，命中为float32向量，未命中为None
+        """
+        keys = [self._key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            # 分批查询，避免超过SQLite的参数个数限制
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, vec FROM embeddings WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                found.update(rows)
+        return [np.frombuffer(found[key], dtype=np.float32) if key in found else None for key in keys]
+    
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """写入缓存（向量为None的文本不写入）"""
+        rows = [
+            (self._key(model, text), model, np.asarray(vec, dtype=np.float32).tobytes())
+            for text, vec in zip(texts, vectors) if vec is not None
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+    
+    def fetch(self, model: str, texts: List[str], embed_fn) -> List[Any]:
+        """
+        先查缓存，只对未命中的文本调用embed_fn，结果写回缓存
+        
+        Args:
+            model (str): embedding模型名称
+            texts (List[str]): 输入文本列表
+            embed_fn (Callable): 接收未命中文本列表，返回对应向量列表（失败的为None）
+            
+        Returns:
+            List: 与texts顺序一致的向量列表，未能生成向量的为None
+        """
+        vectors = self.get_many(model, texts)
+        missing = [i for i, vec in enumerate(vectors) if vec is None]
+        if missing:
+            if len(missing) < len(texts):
+                print(f"embedding缓存命中 {len(texts) - len(missing)}/{len(texts)}")
+            new_vectors = embed_fn([texts[i] for i in missing])
+            self.put_many(model, [texts[i] for i in missing], new_vectors)
+            for i, vec in zip(missing, new_vectors):
+                vectors[i] = vec
+        return vectors
+
 class VectorDatabase:
     """向量数据库类"""
     
-    def __init__(self, api_key=None, model_name="text-embedding-3-small"):
+    def __init__(self, api_key=None, model_name="text-embedding-3-small",
+                 cache_path="./.embed_cache.db", precision="fp16", use_gpu=False):
         """
         初始化向量数据库
         
         Args:
             api_key (str): OpenAI API密钥
             model_name (str): embedding模型名称
+            cache_path (str): embedding缓存文件路径
+            precision (str): 索引中向量的存储精度 (fp32/fp16/sq8)
+            use_gpu (bool): 大规模数据时在GPU上构建索引（需要faiss-gpu）
         """
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.model_name = model_name
-        self.client = OpenAI(api_key=self.api_key)
+        self.precision = precision
+        self.use_gpu = use_gpu
+        self.client = OpenAI(api_key=self.api_key, http_client=get_http_client())
+        self.embedding_cache = EmbeddingCache(cache_path)
         self.index = None
+        self.index_type = None
         self.texts = []
         self.metadata = []
-        self.embeddings = []
         
         if not self.api_key:
             raise ValueError("请在.env文件中设置OPENAI_API_KEY")
@@ -52,19 +306,132 @@ class VectorDatabase:
         Returns:
             List[float]: 向量表示
         """
-        for attempt in range(max_retries):
-            try:
-                response = self.client.embeddings.create(
-                    input=text,
-                    model=self.model_name
-                )
-                return response.data[0].embedding
-            except Exception as e:
-                print(f"获取embedding失败 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # 指数退避
-                else:
-                    raise e
+        def embed(texts):
+            for attempt in range(max_retries):
+                try:
+                    response = self.client.embeddings.create(
+                        input=texts[0],
+                        model=self.model_name
+                    )
+                    return [response.data[0].embedding]
+                except Exception as e:
+                    print(f"获取embedding失败 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
+                    if attempt < max_retries - 1 and _is_retryable(e):
+                        time.sleep(2 ** attempt)  # 指数退避
+                    else:
+                        raise e
+        
+        return np.asarray(self.embedding_cache.fetch(self.model_name, [text], embed)[0], dtype=np.float32).tolist()
+    
+    def get_embeddings_batch(self, texts: List[str], batch_size: int = 64,
+                             max_retries: int = 3, concurrency: int = 8) -> Tuple[np.ndarray, List[int]]:
+        """
+        批量获取文本的向量表示，多个批次并发请求
+        
+        结果直接写入预先分配的float32矩阵，不经过中间的Python列表。
+        某批出现不可重试的错误时改为逐条请求，仍然失败的文本被跳过
+        
+        Args:
+            texts (List[str]): 输入文本列表
+            batch_size (int): 每个请求的文本数量
+            max_retries (int): 每批的最大重试次数
+            concurrency (int): 同时进行的请求数量
+            
+        Returns:
+            Tuple[np.ndarray, List[int]]: (向量矩阵, 成功生成向量的文本下标)，矩阵各行与下标一一对应
+        """
+        cached = self.embedding_cache.get_many(self.model_name, texts)
+        hits = [i for i, vec in enumerate(cached) if vec is not None]
+        missing = [i for i, vec in enumerate(cached) if vec is None]
+        embeddings = None
+        failed = set()
+        
+        def write_rows(indices, vectors):
+            nonlocal embeddings
+            if embeddings is None:
+                embeddings = np.empty((len(texts), len(vectors[0])), dtype=np.float32)
+            embeddings[indices] = vectors
+        
+        if hits:
+            write_rows(hits, np.stack([cached[i] for i in hits]))
+        
+        # 只对缓存未命中的文本请求API，每批完成后立即写入矩阵和缓存
+        if missing:
+            if hits:
+                print(f"embedding缓存命中 {len(hits)}/{len(texts)}")
+            batches = [missing[start:start + batch_size] for start in range(0, len(missing), batch_size)]
+            
+            def on_batch(n, vectors):
+                ok = [k for k, vec in enumerate(vectors) if vec is not None]
+                failed.update(batches[n][k] for k in range(len(vectors)) if vectors[k] is None)
+                if ok:
+                    write_rows([batches[n][k] for k in ok], [vectors[k] for k in ok])
+                    self.embedding_cache.put_many(self.model_name, [texts[batches[n][k]] for k in ok],
+                                                  [vectors[k] for k in ok])
+            
+            asyncio.run(self._aembed_batches(
+                [[texts[i] for i in batch] for batch in batches], max_retries, concurrency, on_batch
+            ))
+        
+        if embeddings is None:
+            return np.empty((0, 0), dtype=np.float32), []
+        if failed:
+            kept = [i for i in range(len(texts)) if i not in failed]
+            return embeddings[kept], kept
+        return embeddings, list(range(len(texts)))
+    
+    async def _aembed_batches(self, batches: List[List[str]], max_retries: int,
+                              concurrency: int, on_batch):
+        """并发请求各批次的embedding，每批完成后调用on_batch(批次序号, 向量列表)，失败的文本对应None"""
+        semaphore = asyncio.Semaphore(concurrency)
+        total = sum(len(batch) for batch in batches)
+        done = 0
+        
+        # 异步连接池绑定在当前事件循环上，每次asyncio.run单独创建
+        http_client = httpx.AsyncClient(http2=HTTP2, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        async with AsyncOpenAI(api_key=self.api_key, http_client=http_client) as aclient:
+            
+            async def request(batch):
+                for attempt in range(max_retries):
+                    try:
+                        response = await aclient.embeddings.create(
+                            input=batch,
+                            model=self.model_name
+                        )
+                        # 返回结果与输入顺序一致，按index排序以防万一
+                        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+                    except Exception as e:
+                        print(f"批量获取embedding失败 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
+                        if attempt < max_retries - 1 and _is_retryable(e):
+                            await asyncio.sleep(2 ** attempt)  # 指数退避
+                        else:
+                            raise e
+            
+            async def embed(n, batch):
+                nonlocal done
+                async with semaphore:
+                    try:
+                        vectors = await request(batch)
+                    except Exception as e:
+                        if _is_retryable(e):
+                            raise
+                        # 不可重试的错误通常由个别文本引起（如超出长度限制），逐条请求以定位并跳过
+                        vectors = [None] * len(batch)
+                        if len(batch) > 1:
+                            print(f"第 {n + 1} 批请求失败，改为逐条请求")
+                            for k, text in enumerate(batch):
+                                try:
+                                    vectors[k] = (await request([text]))[0]
+                                except Exception as e:
+                                    if _is_retryable(e):
+                                        raise
+                        print(f"跳过 {vectors.count(None)} 个无法生成向量的文档块")
+                
+                on_batch(n, vectors)
+                done += len(batch)
+                print(f"已完成 {done}/{total} 个文档块...")
+            
+            await asyncio.gather(*(embed(n, batch) for n, batch in enumerate(batches)))
     
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
         """
@@ -81,23 +448,7 @@ class VectorDatabase:
         if len(text) <= chunk_size:
             return [text]
         
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            if end > len(text):
-                end = len(text)
-            
-            chunk = text[start:end]
-            chunks.append(chunk)
-            
-            if end == len(text):
-                break
-                
-            start = end - overlap
-        
-        return chunks
+        return [text[start:end] for start, end in _chunk_ranges(len(text), chunk_size, overlap).tolist()]
     
     def process_md_content(self, md_text: str, file_path: str = '', min_chunk_size: int = 2000) -> List[Dict]:
         """
@@ -111,45 +462,19 @@ class VectorDatabase:
         Returns:
             List[Dict]: 处理后的文档列表
         """
-        # 首先按章节分割，获取所有章节
+        # 首先按章节分割，获取所有章节：一次正则扫描找出所有标题行，
+        # 每个章节为当前标题行起到下一个标题行之前的原文（第一个标题之前的内容忽略）
+        headings = [(m.start(), m.group(0).strip(), len(m.group(1))) for m in _HEADING_RE.finditer(md_text)]
         raw_sections = []
-        lines = md_text.split('\n')
-        current_section = []
-        current_title = ""
-        section_level = 0
-        
-        for line in lines:
-            line_stripped = line.strip()
-            
-            # 检查是否是标题行
-            if line_stripped.startswith('#'):
-                # 如果之前有内容，保存之前的章节
-                if current_section and current_title:
-                    content = '\n'.join(current_section).strip()
-                    if content:  # 跳过空章节
-                        raw_sections.append({
-                            'text': content,
-                            'title': current_title,
-                            'level': section_level
-                        })
-                
-                # 开始新章节
-                current_title = line_stripped
-                section_level = len(line_stripped) - len(line_stripped.lstrip('#'))
-                current_section = [line]  # 包含标题（保持原始格式）
-                
-            else:
-                # 添加到当前章节
-                current_section.append(line)  # 保持原始格式
         
-        # 处理最后一个章节
-        if current_section and current_title:
-            content = '\n'.join(current_section).strip()
+        for i, (start, title, level) in enumerate(headings):
+            end = headings[i + 1][0] if i + 1 < len(headings) else len(md_text)
+            content = md_text[start:end].strip()
             if content:  # 跳过空章节
                 raw_sections.append({
                     'text': content,
-                    'title': current_title,
-                    'level': section_level
+                    'title': title,
+                    'level': level
                 })
         
         if not raw_sections:
@@ -228,18 +553,16 @@ class VectorDatabase:
         
         return documents
     
-    def build_index(self, content_list) -> bool:
+    def _collect_documents(self, content_list) -> List[Dict]:
         """
-        构建向量索引
+        从解析后的内容中提取待索引的文档章节
         
         Args:
-            content_data (List): 包含MD数据的字典
+            content_list (List): 包含MD数据的字典列表
             
         Returns:
-            bool: 是否成功
+            List[Dict]: 文档章节列表
         """
-        print("开始构建向量索引...")
-        
         documents = []
 
         for content_data in content_list:
@@ -255,35 +578,163 @@ class VectorDatabase:
                 documents.extend(md_docs)
                 
                 print(f"从MD文件中提取了 {len(md_docs)} 个章节")
-            
-            # if not documents:
-            #     print("❌ 没有找到可处理的文档内容")
-            #     return False
         
         print(f"总共处理 {len(documents)} 个文档章节")
+        return documents
+    
+    def build_index(self, content_list) -> bool:
+        """
+        构建向量索引
+        
+        Args:
+            content_list (List): 包含MD数据的字典列表
+            
+        Returns:
+            bool: 是否成功
+        """
+        print("开始构建向量索引...")
+        
+        documents = self._collect_documents(content_list)
         
-        # 生成embeddings
+        # 生成embeddings（批量请求）
         print("生成向量表示...")
-        embeddings = []
-        texts = []
-        metadata = []
+        try:
+            embeddings, kept = self.get_embeddings_batch([doc['text'] for doc in documents])
+        except Exception as e:
+            print(f"生成向量表示失败: {str(e)}")
+            return False
         
-        for i, doc in enumerate(documents):
-            try:
-                print(f"处理第 {i+1}/{len(documents)} 个文档块...")
-                embedding = self.get_embedding(doc['text'])
-                embeddings.append(embedding)
-                texts.append(doc['text'])
-                metadata.append(doc)
-                
-                # 添加小延迟避免API限制
-                time.sleep(0.1)
-                
-            except Exception as e:
-                print(f"处理文档块 {i} 失败: {str(e)}")
-                continue
+        # 丢弃未能生成向量的文档块
+        if len(kept) < len(documents):
+            documents = [documents[i] for i in kept]
+        
+        return self._build_from_embeddings(documents, embeddings)
+    
+    def build_index_batch(self, content_list, poll_interval: int = 30) -> bool:
+        """
+        使用OpenAI Batch API离线构建向量索引（费用更低，但可能需要数小时）
+        
+        Args:
+            content_list (List): 包含MD数据的字典列表
+            poll_interval (int): 查询批任务状态的间隔秒数
+            
+        Returns:
+            bool: 是否成功
+        """
+        print("开始构建向量索引 (Batch API)...")
+        
+        documents = self._collect_documents(content_list)
+        
+        print("提交批量embedding任务...")
+        try:
+            embeddings = self.embedding_cache.fetch(
+                self.model_name,
+                [doc['text'] for doc in documents],
+                lambda texts: self._embed_with_batch_api(texts, poll_interval)
+            )
+        except Exception as e:
+            print(f"批量embedding任务失败: {str(e)}")
+            return False
+        
+        # 丢弃未能生成向量的文档块
+        kept = [i for i, vec in enumerate(embeddings) if vec is not None]
+        if len(kept) < len(documents):
+            documents = [documents[i] for i in kept]
+            embeddings = [embeddings[i] for i in kept]
         
-        if not embeddings:
+        return self._build_from_embeddings(documents, embeddings)
+    
+    def _embed_with_batch_api(self, texts: List[str], poll_interval: int,
+                              max_requests: int = 50000,
+                              max_bytes: int = 190 * 1024 * 1024) -> List[List[float]]:
+        """
+        通过Batch API获取向量表示，每条文本一个请求，按custom_id还原顺序
+        
+        Args:
+            texts (List[str]): 输入文本列表
+            poll_interval (int): 查询批任务状态的间隔秒数
+            max_requests (int): 单个批任务的最大请求数
+            max_bytes (int): 单个输入文件的最大字节数（API上限为200MB，留出余量）
+            
+        Returns:
+            List[List[float]]: 与输入顺序一致的向量列表，请求失败的文本为None
+        """
+        batch_ids = []
+        
+        def submit(lines):
+            input_file = self.client.files.create(
+                file=("embeddings_batch.jsonl", b"\n".join(lines)),
+                purpose="batch"
+            )
+            batch = self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/embeddings",
+                completion_window="24h"
+            )
+            print(f"已提交批任务: {batch.id} ({len(lines)} 个请求)")
+            batch_ids.append(batch.id)
+        
+        # 提交批任务（请求数或文件大小超过单批上限时拆分为多个）
+        lines = []
+        size = 0
+        for i, text in enumerate(texts):
+            line = json.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/embeddings",
+                "body": {"model": self.model_name, "input": text}
+            }, ensure_ascii=False).encode('utf-8')
+            if lines and (len(lines) >= max_requests or size + len(line) + 1 > max_bytes):
+                submit(lines)
+                lines = []
+                size = 0
+            lines.append(line)
+            size += len(line) + 1
+        if lines:
+            submit(lines)
+        
+        # 等待完成并下载结果
+        embeddings = [None] * len(texts)
+        for batch_id in batch_ids:
+            while True:
+                batch = self.client.batches.retrieve(batch_id)
+                if batch.status not in ("validating", "in_progress", "finalizing"):
+                    break
+                counts = batch.request_counts
+                print(f"批任务 {batch_id} 状态: {batch.status} "
+                      f"({counts.completed if counts else 0}/{counts.total if counts else '?'})")
+                time.sleep(poll_interval)
+            
+            if batch.status != "completed" or not batch.output_file_id:
+                raise RuntimeError(f"批任务 {batch_id} 未成功完成: {batch.status}")
+            
+            output = self.client.files.content(batch.output_file_id).text
+            for line in output.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    embeddings[int(record["custom_id"])] = response["body"]["data"][0]["embedding"]
+        
+        missing = sum(1 for embedding in embeddings if embedding is None)
+        if missing:
+            print(f"跳过 {missing} 个未获得向量表示的文档块")
+        
+        return embeddings
+    
+    def _build_from_embeddings(self, documents: List[Dict], embeddings) -> bool:
+        """
+        用文档及其向量构建FAISS索引
+        
+        Args:
+            documents (List[Dict]): 文档章节列表
+            embeddings (np.ndarray | List[List[float]]): 与documents顺序一致的向量
+            
+        Returns:
+            bool: 是否成功
+        """
+        if len(embeddings) == 0:
             print("❌ 没有成功生成任何向量表示")
             return False
         
@@ -291,26 +742,60 @@ class VectorDatabase:
         
         # 构建FAISS索引
         print("构建FAISS索引...")
-        embeddings_array = np.array(embeddings).astype('float32')
+        # 已是float32矩阵时不复制
+        embeddings_array = np.asarray(embeddings, dtype=np.float32)
         dimension = embeddings_array.shape[1]
         
-        # 创建FAISS索引（使用余弦相似度）
-        self.index = faiss.IndexFlatIP(dimension)  # Inner Product for cosine similarity
-        
-        # 标准化向量以使用余弦相似度
+        # 原地标准化向量以使用余弦相似度
         faiss.normalize_L2(embeddings_array)
         
+        # 创建FAISS索引（内积 + 标准化向量 = 余弦相似度）
+        self.index_type = _index_factory_string(len(embeddings_array), self.precision)
+        print(f"索引类型: {self.index_type}")
+        self.index = faiss.index_factory(dimension, self.index_type, faiss.METRIC_INNER_PRODUCT)
+        
+        # 大规模数据在GPU上训练和添加，完成后转回CPU索引以便保存
+        build_index = self.index
+        if self.use_gpu and len(embeddings_array) >= GPU_MIN_VECTORS:
+            if hasattr(faiss, 'StandardGpuResources') and faiss.get_num_gpus() > 0:
+                print("使用GPU构建索引...")
+                gpu_resources = faiss.StandardGpuResources()
+                build_index = faiss.index_cpu_to_gpu(gpu_resources, 0, self.index)
+            else:
+                print("⚠️ 未检测到可用GPU (需要安装faiss-gpu)，使用CPU构建")
+        
+        # IVF、SQ8等索引需要先训练
+        if not build_index.is_trained:
+            build_index.train(embeddings_array)
+        
         # 添加向量到索引
-        self.index.add(embeddings_array)
+        build_index.add(embeddings_array)
+        
+        if build_index is not self.index:
+            self.index = faiss.index_gpu_to_cpu(build_index)
         
         # 保存数据
-        self.texts = texts
-        self.metadata = metadata
-        self.embeddings = embeddings
+        self.texts = [doc['text'] for doc in documents]
+        self.metadata = documents
         
         print(f"✅ 向量索引构建完成! 索引包含 {self.index.ntotal} 个向量")
         return True
     
+    def reconstruct_embeddings(self) -> np.ndarray:
+        """
+        从FAISS索引按需还原全部向量（向量只由索引持有，不在内存中另存一份）
+        
+        Returns:
+            np.ndarray: 形状为 (ntotal, dimension) 的向量矩阵（经过归一化，量化索引为近似值）
+        """
+        if self.index is None:
+            return np.empty((0, 0), dtype=np.float32)
+        try:
+            faiss.extract_index_ivf(self.index).make_direct_map()
+        except RuntimeError:
+            pass  # 非IVF索引
+        return self.index.reconstruct_n(0, self.index.ntotal)
+    
     def save_database(self, db_dir: str = "./vector_db"):
         """
         保存向量数据库
@@ -320,26 +805,71 @@ class VectorDatabase:
         """
         os.makedirs(db_dir, exist_ok=True)
         
-        # 保存FAISS索引
-        faiss.write_index(self.index, os.path.join(db_dir, "index.faiss"))
+        # 先写入临时文件，全部写完后再替换正式文件。替换只更换目录项，不会原地修改
+        # 硬链接备份共享的数据，也不会影响正在内存映射旧文件的进程
+        def tmp(name):
+            return os.path.join(db_dir, f".tmp-{name}")
         
-        # 保存文本和元数据
-        with open(os.path.join(db_dir, "texts.pkl"), 'wb') as f:
-            pickle.dump(self.texts, f)
+        # 保存FAISS索引
+        faiss.write_index(self.index, tmp("index.faiss"))
         
-        with open(os.path.join(db_dir, "metadata.pkl"), 'wb') as f:
-            pickle.dump(self.metadata, f)
+        # 保存文本和元数据（加载时内存映射，按需解码）
+        write_records(tmp("texts.bin"), tmp("texts_offsets.npy"),
+                      (text.encode('utf-8') for text in self.texts))
+        write_records(tmp("metadata.jsonl"), tmp("metadata_offsets.npy"),
+                      ((json.dumps(meta, ensure_ascii=False) + "\n").encode('utf-8') for meta in self.metadata))
         
         # 保存配置信息
         config = {
             'model_name': self.model_name,
             'dimension': self.index.d if self.index else 0,
-            'total_vectors': self.index.ntotal if self.index else 0
+            'total_vectors': self.index.ntotal if self.index else 0,
+            'index_type': self.index_type or 'Flat',
+            'precision': self.precision
         }
         
-        with open(os.path.join(db_dir, "config.json"), 'w', encoding='utf-8') as f:
+        with open(tmp("config.json"), 'w', encoding='utf-8') as f:
             json.dump(config, f, ensure_ascii=False, indent=2)
         
+        written = ("index.faiss", "texts.bin", "texts_offsets.npy",
+                   "metadata.jsonl", "metadata_offsets.npy", "config.json")
+        
+        def path(name):
+            return os.path.join(db_dir, name)
+        
+        def bak(name):
+            return os.path.join(db_dir, f".bak-{name}")
+        
+        # 先把旧文件（包括旧格式遗留的文件）全部移开，再放入新文件；任何一步失败都恢复原状，
+        # 避免新旧文件混在一起。Windows上被内存映射的文件无法移动，会在第一步失败
+        moved = []
+        placed = []
+        try:
+            for name in DB_FILES:
+                if os.path.exists(path(name)):
+                    os.replace(path(name), bak(name))
+                    moved.append(name)
+            for name in written:
+                os.replace(tmp(name), path(name))
+                placed.append(name)
+        except OSError as e:
+            for name in placed:
+                os.unlink(path(name))
+            for name in moved:
+                os.replace(bak(name), path(name))
+            for name in written:
+                try:
+                    os.unlink(tmp(name))
+                except FileNotFoundError:
+                    pass
+            raise RuntimeError(f"数据库 {db_dir} 的文件无法替换（可能正在被问答系统使用），请关闭后重试: {str(e)}") from e
+        
+        for name in moved:
+            try:
+                os.unlink(bak(name))
+            except OSError:
+                pass
+        
         print(f"✅ 向量数据库已保存到: {db_dir}")
     
     def load_database(self, db_dir: str = "./vector_db"):
@@ -352,21 +882,26 @@ class VectorDatabase:
         # 加载FAISS索引
         index_path = os.path.join(db_dir, "index.faiss")
         if os.path.exists(index_path):
-            self.index = faiss.read_index(index_path)
+            self.index = read_index(index_path)
         
         # 加载文本和元数据
-        texts_path = os.path.join(db_dir, "texts.pkl")
-        if os.path.exists(texts_path):
-            with open(texts_path, 'rb') as f:
-                self.texts = pickle.load(f)
-        
-        metadata_path = os.path.join(db_dir, "metadata.pkl")
-        if os.path.exists(metadata_path):
-            with open(metadata_path, 'rb') as f:
-                self.metadata = pickle.load(f)
+        self.texts, self.metadata = load_texts_and_metadata(db_dir)
         
         print(f"✅ 向量数据库已加载: {len(self.texts)} 个文档")
 
+def _iter_md(root: str):
+    """递归产出目录下的.md文件路径，边扫描边产出，不先构建完整的文件列表"""
+    try:
+        it = os.scandir(root)
+    except OSError:
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_md(entry.path)
+            elif entry.name.endswith('.md') and entry.is_file():
+                yield entry.path
+
 def load_parsed_content(output_dir: str = "./output"):
     """
     加载解析后的内容
@@ -375,77 +910,107 @@ def load_parsed_content(output_dir: str = "./output"):
         output_dir (str): 输出目录
         
     Returns:
-        Dict: 内容数据
+        List[Dict]: 每个MD文件一条内容数据
     """
     content_list = []
-    content = {}
     
-    for root, dirs, files in os.walk(output_dir):
-        for file in files:
-            file_path = os.path.join(root, file)
-                    
-            if file.endswith('.md'):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    print("file_path:",file_path)
-                    content['md_data'] = f.read()
-                    content['md_path'] = file_path
-                    content_list.append(content)
-                    content = {}
+    for file_path in _iter_md(output_dir):
+        print("file_path:", file_path)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            md_data = f.read()
+        content_list.append({'md_data': md_data, 'md_path': file_path})
     
     return content_list
 
-if __name__ == "__main__":
-    import argparse
-    
-    # 解析命令行参数
-    # python step2_vector_database.py -i ./output2  -d "vector_db_iec" -m "text-embedding-3-large"
-
-    parser = argparse.ArgumentParser(description='向量数据库构建器')
-    parser.add_argument('--input-dir', '-i', default="./output", 
-                       help='输入目录 (解析后的内容)')
-    parser.add_argument('--db-dir', '-d', default="./vector_db", 
-                       help='向量数据库输出目录')
-    parser.add_argument('--model', '-m', default="text-embedding-3-small",
-                       help='Embedding模型名称')
-    
-    args = parser.parse_args()
-    
-
-    
-
+def build_vector_database(input_dir: str = "./output", db_dir: str = "./vector_db",
+                          model_name: str = "text-embedding-3-small", db_name: str = None,
+                          use_batch_api: bool = False, precision: str = "fp16",
+                          use_gpu: bool = False) -> bool:
+    """
+    加载解析后的内容，构建并保存向量数据库
     
+    Args:
+        input_dir (str): 输入目录 (解析后的内容)
+        db_dir (str): 向量数据库输出目录
+        model_name (str): Embedding模型名称
+        db_name (str): 数据库名称，仅用于提示信息
+        use_batch_api (bool): 使用OpenAI Batch API离线生成向量
+        precision (str): 索引中向量的存储精度 (fp32/fp16/sq8)
+        use_gpu (bool): 大规模数据时在GPU上构建索引
+        
+    Returns:
+        bool: 是否成功
+    """
     # 加载解析后的内容
     print("\n加载解析后的内容...")
-    content_list = load_parsed_content(args.input_dir)
+    content_list = load_parsed_content(input_dir)
     
     if len(content_list) == 0:
-        print(f"❌ 未找到解析后的内容在 {args.input_dir}")
+        print(f"❌ 未找到解析后的内容在 {input_dir}")
         print("请先运行 Step 1")
-        if args.db_name:
-            print(f"建议命令: python step1_document_parser.py --db-name {args.db_name}")
-        exit(1)
+        if db_name:
+            print(f"建议命令: python step1_document_parser.py --db-name {db_name}")
+        return False
     
     api_key = os.getenv("OPENAI_API_KEY")
     
     # 创建向量数据库
     try:
-        db = VectorDatabase(api_key=api_key, model_name=args.model)
+        db = VectorDatabase(api_key=api_key, model_name=model_name,
+                            precision=precision, use_gpu=use_gpu)
         
         # 构建索引
-        success = db.build_index(content_list)
+        if use_batch_api:
+            success = db.build_index_batch(content_list)
+        else:
+            success = db.build_index(content_list)
         
         if success:
             # 保存数据库
-            db.save_database(args.db_dir)
+            db.save_database(db_dir)
             print(f"\n✅ 向量数据库构建成功!")
-            print(f"数据库路径: {args.db_dir}")
+            print(f"数据库路径: {db_dir}")
             print("接下来运行 Step 3 启动问答系统")
-            # if args.db_name:
-            #     print(f"建议命令: streamlit run step3_qa_system.py")
+            return True
         else:
             print("❌ 向量数据库构建失败!")
-            exit(1)
+            return False
             
     except Exception as e:
         print(f"❌ 构建向量数据库时出错: {str(e)}")
-        exit(1) 
\ No newline at end of file
+        return False
+
+if __name__ == "__main__":
+    import argparse
+    
+    # 解析命令行参数
+    # python step2_vector_database.py -i ./output2  -d "vector_db_iec" -m "text-embedding-3-large"
+
+    parser = argparse.ArgumentParser(description='向量数据库构建器')
+    parser.add_argument('--input-dir', '-i', default="./output", 
+                       help='输入目录 (解析后的内容)')
+    parser.add_argument('--db-dir', '-d', default="./vector_db", 
+                       help='向量数据库输出目录')
+    parser.add_argument('--model', '-m', default="text-embedding-3-small",
+                       help='Embedding模型名称')
+    parser.add_argument('--db-name',
+                       help='数据库名称 (使用 ./output_<名称> 和 ./vector_db_<名称>)')
+    parser.add_argument('--batch-api', action='store_true',
+                       help='使用OpenAI Batch API生成向量 (费用减半，完成可能需要数小时)')
+    parser.add_argument('--precision', choices=list(PRECISIONS), default="fp16",
+                       help='索引中向量的存储精度 (fp16内存减半，sq8减为1/4)')
+    parser.add_argument('--gpu', action='store_true',
+                       help=f'向量数不少于{GPU_MIN_VECTORS}时使用GPU构建索引 (需要faiss-gpu)')
+    
+    args = parser.parse_args()
+    
+    # 如果指定了数据库名称，调整输入输出路径
+    if args.db_name:
+        args.input_dir = f"./output_{args.db_name}"
+        args.db_dir = f"./vector_db_{args.db_name}"
+        print(f"📁 使用专用目录: {args.input_dir} -> {args.db_dir}")
+    
+    if not build_vector_database(args.input_dir, args.db_dir, args.model, args.db_name,
+                                 use_batch_api=args.batch_api, precision=args.precision,
+                                 use_gpu=args.gpu):
+        exit(1)
@@ -7,18 +7,180 @@ Step 3: 问答系统前后端
 
 import os
 import streamlit as st
+
+# MKL/Intel OpenMP线程绑定核心，需在导入faiss之前设置
+os.environ.setdefault('KMP_AFFINITY', 'granularity=fine,compact,1,0')
+
 import faiss
-import pickle
 import numpy as np
 from dotenv import load_dotenv
 from openai import OpenAI
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator
 import json
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
 from datetime import datetime
+from step2_vector_database import EmbeddingCache, get_http_client, load_texts_and_metadata, read_index
 
 # 加载环境变量
 load_dotenv()
 
+def _available_cpus() -> int:
+    """当前进程可用的CPU数（遵循CPU亲和性掩码，不支持时退回os.cpu_count()）"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 4
+
+# 固定FAISS的OpenMP线程数，可通过FAISS_THREADS按容器的CPU配额调整
+faiss.omp_set_num_threads(int(os.getenv('FAISS_THREADS', _available_cpus())))
+
+# 问题中包含该标记时不使用语义缓存
+NO_CACHE_MARKER = "--no-cache"
+
+# 生成回答出错时返回内容的前缀（此类回答不进入缓存）
+RESPONSE_ERROR_PREFIX = "生成回答时出错"
+
+# 发送给模型的对话历史上限（最近10条消息，即5轮对话）
+MAX_HISTORY_MESSAGES = 10
+
+# 检索文档之间的分隔符
+CONTEXT_SEPARATOR = "\n---\n"
+
+# 系统提示模板（模块加载时构建一次，每轮只需format上下文）
+SYSTEM_PROMPT_TEMPLATE = """你是一个智能助手，专门帮助企业内部提效。你会基于提供的文档内容来回答问题。
+
+请遵循以下规则：
+1. 主要基于提供的上下文内容来回答问题
+2. 如果上下文中没有相关信息，请诚实地说明
+3. 保持回答的准确性和专业性  
+4. 如果可能，提供具体的引用或出处
+5. 回答要简洁明了，便于理解
+6. 支持中文对话
+
+上下文信息：
+{context}
+"""
+
+def _tune_search_params(index, ef_search: int = 64, nprobe: int = 16):
+    """设置近似索引的检索参数（HNSW的efSearch、IVF的nprobe），平衡召回率和延迟"""
+    if hasattr(index, 'hnsw'):
+        index.hnsw.efSearch = ef_search
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass  # 非IVF索引
+
+class _QueryBatcher:
+    """
+    合并短时间窗口内并发到达的查询，一次批量embedding + FAISS检索
+    
+    Streamlit为每个会话使用独立线程，submit会阻塞直到所在批次完成
+    """
+    
+    def __init__(self, search_batch_fn, window: float = 0.02, max_batch: int = 32):
+        self._search_batch_fn = search_batch_fn
+        self._window = window
+        self._max_batch = max_batch
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+    
+    def submit(self, query: str, top_k: int) -> tuple:
+        future = Future()
+        self._queue.put((query, top_k, future))
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+        return future.result()
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._window
+            while len(batch) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                top_k = max(item[1] for item in batch)
+                results = self._search_batch_fn([item[0] for item in batch], top_k)
+                for (_, k, future), (query_vector, docs) in zip(batch, results):
+                    future.set_result((query_vector, docs[:k]))
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][2].set_exception(e)
+                    continue
+                # 合并的批次失败时逐条重试，个别问题的错误（如问题过长）不影响同批的其他会话
+                for query, k, future in batch:
+                    try:
+                        future.set_result(self._search_batch_fn([query], k)[0])
+                    except Exception as item_error:
+                        future.set_exception(item_error)
+
+class _SemanticCache:
+    """
+    语义缓存：与已回答问题的向量足够相似（余弦相似度）、检索数量相同且未过期时直接复用回答
+    
+    查询向量需已标准化，使用内积索引即为余弦相似度
+    """
+    
+    # 每次查找检查的最近邻数量（相似问题可能以不同top_k各缓存一条）
+    CANDIDATES = 8
+    
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_entries: int = 1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._index = None
+        self._entries = []  # (查询向量, 问题, top_k, 结果, 时间戳)
+        self._lock = threading.Lock()
+    
+    def lookup(self, query_vector: np.ndarray, top_k: int):
+        """返回命中的缓存结果，未命中返回None"""
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                return None
+            k = min(self.CANDIDATES, self._index.ntotal)
+            similarities, indices = self._index.search(query_vector.reshape(1, -1), k)
+            now = time.time()
+            for similarity, idx in zip(similarities[0], indices[0]):
+                if idx == -1 or similarity < self.threshold:
+                    break
+                _, _, entry_top_k, result, timestamp = self._entries[idx]
+                if entry_top_k == top_k and now - timestamp <= self.ttl:
+                    return result
+            return None
+    
+    def add(self, query_vector: np.ndarray, query: str, top_k: int, result: Dict[str, Any]):
+        """缓存一次回答"""
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexFlatIP(len(query_vector))
+            if len(self._entries) >= self.max_entries:
+                self._rebuild()
+            self._index.add(query_vector.reshape(1, -1))
+            self._entries.append((query_vector, query, top_k, result, time.time()))
+    
+    def _rebuild(self):
+        """丢弃过期条目，仍然过多时只保留最近的一半"""
+        now = time.time()
+        entries = [e for e in self._entries if now - e[4] <= self.ttl]
+        if len(entries) >= self.max_entries:
+            entries = entries[-(self.max_entries // 2):]
+        self._index.reset()
+        if entries:
+            self._index.add(np.stack([e[0] for e in entries]))
+        self._entries = entries
+
 class RAGChatbot:
     """RAG聊天机器人类"""
     
@@ -42,13 +204,20 @@ class RAGChatbot:
         if not self.api_key:
             raise ValueError("请在.env文件中设置OPENAI_API_KEY")
         
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = OpenAI(api_key=self.api_key, http_client=get_http_client())
+        self.embedding_cache = EmbeddingCache()
         
         # 加载向量数据库
         self.load_vector_database()
         
         # 初始化对话历史
-        self.conversation_history = []
+        self.conversation_history = deque(maxlen=MAX_HISTORY_MESSAGES)
+        
+        # 并发查询合并器
+        self._batcher = _QueryBatcher(self._retrieve_batch)
+        
+        # 相似问题的回答缓存
+        self._semantic_cache = _SemanticCache()
     
     def load_vector_database(self):
         """加载向量数据库"""
@@ -56,14 +225,16 @@ class RAGChatbot:
             # 加载FAISS索引
             index_path = os.path.join(self.vector_db_path, "index.faiss")
             print("index_path:",index_path)
-            self.index = faiss.read_index(index_path)
+            self.index = read_index(index_path)
+            _tune_search_params(self.index)
             
-            # 加载文本和元数据
-            with open(os.path.join(self.vector_db_path, "texts.pkl"), 'rb') as f:
-                self.texts = pickle.load(f)
+            # 预热：提前拉起OpenMP线程，避免首个查询承担线程创建的开销
+            self.index.search(np.zeros((1, self.index.d), dtype=np.float32), 1)
             
-            with open(os.path.join(self.vector_db_path, "metadata.pkl"), 'rb') as f:
-                self.metadata = pickle.load(f)
+            # 加载文本和元数据（内存映射，按需读取）
+            self.texts, self.metadata = load_texts_and_metadata(self.vector_db_path)
+            if len(self.texts) != self.index.ntotal:
+                raise ValueError(f"文本数量({len(self.texts)})与索引向量数({self.index.ntotal})不一致")
             
             # 加载配置
             with open(os.path.join(self.vector_db_path, "config.json"), 'r', encoding='utf-8') as f:
@@ -76,11 +247,18 @@ class RAGChatbot:
     
     def get_embedding(self, text: str) -> List[float]:
         """获取文本的向量表示"""
-        response = self.client.embeddings.create(
-            input=text,
-            model=self.embedding_model
-        )
-        return response.data[0].embedding
+        return np.asarray(self._embed_queries([text])[0], dtype=np.float32).tolist()
+    
+    def _embed_queries(self, queries: List[str]) -> List[Any]:
+        """批量获取查询向量，重复的问题直接从缓存读取"""
+        def embed(texts):
+            response = self.client.embeddings.create(
+                input=texts,
+                model=self.embedding_model
+            )
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+        
+        return self.embedding_cache.fetch(self.embedding_model, queries, embed)
     
     def search_similar_documents(self, query: str, top_k: int = 5) -> List[Dict]:
         """
@@ -93,140 +271,201 @@ class RAGChatbot:
         Returns:
             List[Dict]: 相似文档列表
         """
+        return self.search_similar_documents_batch([query], top_k)[0]
+    
+    def search_similar_documents_batch(self, queries: List[str], top_k: int = 5) -> List[List[Dict]]:
+        """
+        批量搜索相似文档，一次embedding请求和一次FAISS检索处理所有查询
+        
+        Args:
+            queries (List[str]): 查询文本列表
+            top_k (int): 每个查询返回的文档数量
+            
+        Returns:
+            List[List[Dict]]: 与queries顺序一致的相似文档列表
+        """
+        return [docs for _, docs in self._retrieve_batch(queries, top_k)]
+    
+    def _retrieve_batch(self, queries: List[str], top_k: int) -> List[tuple]:
+        """批量检索，返回每个查询的(标准化查询向量, 相似文档列表)"""
         # 获取查询向量
-        query_embedding = self.get_embedding(query)
-        query_vector = np.array([query_embedding]).astype('float32')
+        query_vectors = np.array(self._embed_queries(queries), dtype='float32')
         
         # 标准化查询向量
-        faiss.normalize_L2(query_vector)
+        faiss.normalize_L2(query_vectors)
         
         # 搜索相似文档
-        distances, indices = self.index.search(query_vector, top_k)
-        
-        results = []
-        for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-            if idx != -1:  # 有效索引
-                result = {
-                    'text': self.texts[idx],
-                    'metadata': self.metadata[idx],
-                    'similarity': float(distance),
-                    'rank': i + 1
-                }
-                results.append(result)
-        
-        return results
+        distances, indices = self.index.search(query_vectors, top_k)
+        
+        all_results = []
+        for query_vector, row_distances, row_indices in zip(query_vectors, distances, indices):
+            results = []
+            for i, (distance, idx) in enumerate(zip(row_distances, row_indices)):
+                if idx != -1:  # 有效索引
+                    result = {
+                        'text': self.texts[idx],
+                        'metadata': self.metadata[idx],
+                        'similarity': float(distance),
+                        'rank': i + 1
+                    }
+                    results.append(result)
+            all_results.append((query_vector, results))
+        
+        return all_results
     
     def generate_context_from_documents(self, documents: List[Dict]) -> str:
         """从检索到的文档生成上下文"""
-        context_parts = []
-        
-        for doc in documents:
-            source_info = ""
-            if doc['metadata'].get('source') == 'markdown':
-                section_title = doc['metadata'].get('section_title', 'N/A')
-                section_level = doc['metadata'].get('section_level', 0)
-                source_info = f"[文档章节 - {section_title} (Level {section_level})]"
-            
-            context_parts.append(f"{source_info}\n{doc['text']}\n")
-        
-        return "\n---\n".join(context_parts)
+        return CONTEXT_SEPARATOR.join(
+            f"[文档章节 - {m.get('section_title', 'N/A')} (Level {m.get('section_level', 0)})]\n{doc['text']}\n"
+            if (m := doc['metadata']).get('source') == 'markdown'
+            else f"\n{doc['text']}\n"
+            for doc in documents
+        )
     
     def generate_response(self, user_query: str, context: str, 
-                         conversation_history: List[Dict] = None) -> str:
+                         conversation_history: Iterable[Dict] = None) -> Iterator[str]:
         """
-        生成回答
+        生成回答（流式）
         
         Args:
             user_query (str): 用户问题
             context (str): 检索到的上下文
-            conversation_history (List[Dict]): 对话历史
+            conversation_history (Iterable[Dict]): 对话历史（调用方负责限制长度）
             
         Returns:
-            str: 生成的回答
+            Iterator[str]: 逐段产出的回答文本，请求出错时抛出异常
         """
-        # 构建系统提示
-        system_prompt = """你是一个智能助手，专门帮助企业内部提效。你会基于提供的文档内容来回答问题。
-
-请遵循以下规则：
-1. 主要基于提供的上下文内容来回答问题
-2. 如果上下文中没有相关信息，请诚实地说明
-3. 保持回答的准确性和专业性  
-4. 如果可能，提供具体的引用或出处
-5. 回答要简洁明了，便于理解
-6. 支持中文对话
-
-上下文信息：
-{context}
-"""
-        
         # 构建消息列表
         messages = [
-            {"role": "system", "content": system_prompt.format(context=context)}
+            {"role": "system", "content": SYSTEM_PROMPT_TEMPLATE.format(context=context)}
         ]
         
-        # 添加对话历史（保留最近5轮对话）
+        # 添加对话历史（长度在写入时已限制）
         if conversation_history:
-            recent_history = conversation_history[-10:]  # 最近10条消息（5轮对话）
-            for msg in recent_history:
-                messages.append(msg)
+            messages.extend(conversation_history)
         
         # 添加当前用户问题
         messages.append({"role": "user", "content": user_query})
         
-        # 生成回答
+        response = self.client.chat.completions.create(
+            model=self.chat_model,
+            messages=messages,
+            temperature=0.7,
+            stream=True,
+            # max_tokens=1000
+        )
+        
+        for chunk in response:
+            if chunk.choices and (delta := chunk.choices[0].delta.content):
+                yield delta
+    
+    def _record_turn(self, user_query: str, query_vector: np.ndarray, top_k: int, result: Dict[str, Any],
+                     chunks: Iterable[str], use_cache: bool, history: deque) -> Iterator[str]:
+        """转发回答片段，流结束后写入对话历史和语义缓存"""
+        parts = []
+        failed = False
         try:
-            response = self.client.chat.completions.create(
-                model=self.chat_model,
-                messages=messages,
-                temperature=0.7,
-                # max_tokens=1000
-            )
-            
-            return response.choices[0].message.content
-            
+            for delta in chunks:
+                parts.append(delta)
+                yield delta
         except Exception as e:
-            return f"生成回答时出错: {str(e)}"
+            failed = True
+            error = f"{RESPONSE_ERROR_PREFIX}: {str(e)}"
+            parts.append(error)
+            yield error
+        
+        response = ''.join(parts)
+        result['response'] = response
+        
+        # 更新对话历史
+        history.append({"role": "user", "content": user_query})
+        history.append({"role": "assistant", "content": response})
+        
+        if use_cache and not failed:
+            self._semantic_cache.add(query_vector, user_query, top_k,
+                                     {k: v for k, v in result.items() if k != 'response_stream'})
     
-    def chat(self, user_query: str) -> Dict[str, Any]:
+    def chat(self, user_query: str, top_k: int = 5,
+             conversation_history: deque = None) -> Dict[str, Any]:
         """
         主要的聊天方法
         
         Args:
             user_query (str): 用户问题
+            top_k (int): 检索文档数量
+            conversation_history (deque): 本次会话的对话历史，默认使用实例自带的历史
+                （多个会话共享同一实例时各自传入）
             
         Returns:
-            Dict[str, Any]: 包含回答和相关信息的字典
+            Dict[str, Any]: 包含回答流(response_stream)和相关信息的字典；
+                回答流消费完毕后 'response' 为完整回答
         """
-        # 搜索相关文档
-        similar_docs = self.search_similar_documents(user_query, top_k=5)
+        history = self.conversation_history if conversation_history is None else conversation_history
         
-        # 生成上下文
-        context = self.generate_context_from_documents(similar_docs)
+        # 问题中带有不缓存标记时跳过语义缓存
+        use_cache = NO_CACHE_MARKER not in user_query
+        if not use_cache:
+            user_query = user_query.replace(NO_CACHE_MARKER, '').strip()
         
-        # 生成回答
-        response = self.generate_response(user_query, context, self.conversation_history)
+        # 多轮对话中的追问依赖上文（如"它的价格是多少？"），只有会话首个问题才使用语义缓存
+        use_cache = use_cache and not history
         
-        # 更新对话历史
-        self.conversation_history.append({"role": "user", "content": user_query})
-        self.conversation_history.append({"role": "assistant", "content": response})
+        # 搜索相关文档（与同时到达的其他查询合并检索）
+        query_vector, similar_docs = self._batcher.submit(user_query, top_k)
         
-        return {
-            'response': response,
+        # 相似问题命中缓存时直接复用回答，跳过LLM调用
+        cached = self._semantic_cache.lookup(query_vector, top_k) if use_cache else None
+        if cached is not None:
+            result = dict(cached, timestamp=datetime.now().isoformat(), cached=True)
+            result['response_stream'] = self._record_turn(
+                user_query, query_vector, top_k, result, [cached['response']], False, history)
+            return result
+        
+        # 生成上下文
+        context = self.generate_context_from_documents(similar_docs)
+        
+        result = {
+            'response': '',
             'context': context,
             'similar_documents': similar_docs,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            'cached': False
         }
+        
+        # 流式生成回答，消费完毕后更新对话历史和缓存
+        result['response_stream'] = self._record_turn(
+            user_query, query_vector, top_k, result,
+            self.generate_response(user_query, context, history),
+            use_cache, history)
+        
+        return result
     
     def clear_history(self):
         """清除对话历史"""
-        self.conversation_history = []
+        self.conversation_history.clear()
+
+@st.cache_resource(show_spinner="🔄 正在加载向量数据库...", max_entries=8)
+def get_chatbot(db_path: str, chat_model: str, config_mtime_ns: int) -> RAGChatbot:
+    """
+    获取聊天机器人（按数据库路径、模型和config.json修改时间缓存，进程内所有会话共享同一份索引；
+    数据库重建后config.json变化，缓存自动失效并重新加载）
+    
+    Args:
+        db_path (str): 向量数据库路径
+        chat_model (str): 聊天模型名称
+        config_mtime_ns (int): config.json的修改时间，只用作缓存键
+        
+    Returns:
+        RAGChatbot: 聊天机器人实例
+    """
+    return RAGChatbot(vector_db_path=db_path, chat_model=chat_model)
 
 def get_available_databases():
     """获取可用的数据库列表"""
     databases = []
     
     # 默认数据库
-    if os.path.exists("./vector_db"):
+    if os.path.isdir("./vector_db"):
         databases.append({"name": "默认数据库", "path": "./vector_db"})
     
     # 扫描命名数据库
@@ -297,8 +536,8 @@ def init_streamlit_ui():
         
         # 清除历史按钮
         if st.button("🗑️ 清除对话历史"):
-            if 'chatbot' in st.session_state:
-                st.session_state.chatbot.clear_history()
+            if 'conversation_history' in st.session_state:
+                st.session_state.conversation_history.clear()
             if 'messages' in st.session_state:
                 st.session_state.messages = []
             st.success("对话历史已清除!")
@@ -310,7 +549,7 @@ def init_streamlit_ui():
             chatbot = st.session_state.chatbot
             st.metric("当前数据库", selected_db["name"])
             st.metric("索引文档数", len(chatbot.texts))
-            st.metric("对话轮数", len(chatbot.conversation_history) // 2)
+            st.metric("对话轮数", sum(msg["role"] == "user" for msg in st.session_state.get("messages", [])))
     
     return chat_model, top_k, selected_db_path
 
@@ -329,30 +568,21 @@ def main():
         st.error(f"❌ 未找到向量数据库: {selected_db_path}")
         st.stop()
     
-    # 数据库路径或模型变化时重新初始化聊天机器人
-    chatbot_key = f"chatbot_{selected_db_path}_{chat_model}"
+    # 获取聊天机器人（已加载的数据库在所有会话间共享）
+    try:
+        config_mtime_ns = os.stat(os.path.join(selected_db_path, "config.json")).st_mtime_ns
+        st.session_state.chatbot = get_chatbot(selected_db_path, chat_model, config_mtime_ns)
+    except Exception as e:
+        st.error(f"❌ 系统初始化失败: {str(e)}")
+        st.stop()
     
-    if chatbot_key not in st.session_state or st.session_state.get('current_db_path') != selected_db_path:
-        try:
-            with st.spinner("🔄 正在加载向量数据库..."):
-                st.session_state[chatbot_key] = RAGChatbot(
-                    vector_db_path=selected_db_path,
-                    chat_model=chat_model
-                )
-                st.session_state.chatbot = st.session_state[chatbot_key]
-                st.session_state.current_db_path = selected_db_path
-                
-                # 清除消息历史（切换数据库时）
-                if 'messages' in st.session_state:
-                    st.session_state.messages = []
-                    
-            st.success(f"✅ 已加载数据库: {selected_db_path}")
-        except Exception as e:
-            st.error(f"❌ 系统初始化失败: {str(e)}")
-            st.stop()
-    else:
-        # 使用已存在的聊天机器人
-        st.session_state.chatbot = st.session_state[chatbot_key]
+    # 切换数据库时清除本会话的对话历史
+    if st.session_state.get('current_db_path') != selected_db_path:
+        st.session_state.current_db_path = selected_db_path
+        st.session_state.conversation_history = deque(maxlen=MAX_HISTORY_MESSAGES)
+        if 'messages' in st.session_state:
+            st.session_state.messages = []
+        st.success(f"✅ 已加载数据库: {selected_db_path}")
     
     # 初始化消息历史
     if 'messages' not in st.session_state:
@@ -374,37 +604,38 @@ def main():
         
         # 生成并显示助手回答
         with st.chat_message("assistant"):
-            with st.spinner("🤔 正在思考..."):
-                try:
-                    # 获取聊天机器人回答
-                    result = st.session_state.chatbot.chat(prompt)
-                    response = result['response']
-                    
-                    # 显示回答
-                    st.markdown(response)
-                    
-                    # 显示相关文档（可展开）
-                    with st.expander("📚 相关文档章节", expanded=False):
-                        for i, doc in enumerate(result['similar_documents']):
-                            st.markdown(f"**章节 {i+1}** (相似度: {doc['similarity']:.3f})")
-                            
-                            # 显示章节标题
-                            metadata = doc['metadata']
-                            if metadata.get('source') == 'markdown':
-                                section_title = metadata.get('section_title', 'N/A')
-                                section_level = metadata.get('section_level', 0)
-                                st.markdown(f"**章节标题**: {section_title}")
-                                st.caption(f"章节级别: Level {section_level}")
-                            
-                            # 显示文本内容
-                            text_preview = doc['text'][:300] + "..." if len(doc['text']) > 300 else doc['text']
-                            st.markdown(f"```\n{text_preview}\n```")
-                            
-                            st.divider()
-                    
-                except Exception as e:
-                    response = f"抱歉，处理您的问题时出现错误：{str(e)}"
-                    st.error(response)
+            try:
+                # 检索相关文档
+                with st.spinner("🤔 正在思考..."):
+                    result = st.session_state.chatbot.chat(
+                        prompt, top_k=top_k,
+                        conversation_history=st.session_state.conversation_history)
+                
+                # 边生成边显示回答
+                response = st.write_stream(result['response_stream'])
+                
+                # 显示相关文档（可展开）
+                with st.expander("📚 相关文档章节", expanded=False):
+                    for i, doc in enumerate(result['similar_documents']):
+                        st.markdown(f"**章节 {i+1}** (相似度: {doc['similarity']:.3f})")
+                        
+                        # 显示章节标题
+                        metadata = doc['metadata']
+                        if metadata.get('source') == 'markdown':
+                            section_title = metadata.get('section_title', 'N/A')
+                            section_level = metadata.get('section_level', 0)
+                            st.markdown(f"**章节标题**: {section_title}")
+                            st.caption(f"章节级别: Level {section_level}")
+                        
+                        # 显示文本内容
+                        text_preview = doc['text'][:300] + "..." if len(doc['text']) > 300 else doc['text']
+                        st.markdown(f"```\n{text_preview}\n```")
+                        
+                        st.divider()
+                
+            except Exception as e:
+                response = f"抱歉，处理您的问题时出现错误：{str(e)}"
+                st.error(response)
         
         # 添加助手消息到历史
         st.session_state.messages.append({"role": "assistant", "content": response})